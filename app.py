@@ -1,17 +1,84 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import concurrent.futures
 import json
+import math
+import os
+import threading
 import time
 from streamlit_geolocation import streamlit_geolocation
 import openai # Import OpenAI library
+from caches import (PageCache, RedisSharedCache, RevisionCache, SQLiteSharedCache, SummaryStore, TileCache,
+                    shared_key)
+from geo_index import METERS_PER_DEGREE_LAT, GeoIndex, haversine_meters
+import metrics
+from records import PageRecord
+from rate_limit import OpenAIRateLimiter, estimate_tokens
+from single_flight import SingleFlight
 
 # --- Configuration ---
-WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+WIKIPEDIA_API_URL = os.environ.get("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+HTTP_USER_AGENT = "st-geo-gpt/1.0 (https://github.com/vr00n/st-geo-gpt)" # Required by the Wikimedia User-Agent policy
+HTTP_POOL_SIZE = 20 # Keep-alive connections kept per host, shared by all sessions
+HTTP_MAX_RETRIES = 3 # Retries on connection errors, 429 and 5xx, with exponential backoff
 SEARCH_RADIUS_METERS = 250
-REFRESH_INTERVAL_SECONDS = 30
+TILE_SIZE_METERS = 1000 # Geosearch results are fetched once per tile and filtered locally
+TILE_TTL_SECONDS = 3600
+TILE_CACHE_MAX_TILES = 5000
+TILE_FETCH_LIMIT = 500 # Max gslimit for regular API clients
+MAX_GEOSEARCH_RADIUS_METERS = 10000 # Max gsradius accepted by the API
+GEO_INDEX_PATH = os.environ.get("GEO_INDEX_PATH") # Offline mode: answer geosearch from a geo_index.py file
+REFRESH_INTERVAL_SECONDS = 30 # Initial check interval; adapted to speed, result churn and errors within the bounds below
+MIN_REFRESH_SECONDS = 15 # Intervals are this times a power of two, so the panel's timer changes rarely
+MAX_REFRESH_SECONDS = 300
+STATIONARY_SPEED_MPS = 0.5 # Slower than this is treated as standing still (GPS drift)
+CHURN_SPEEDUP_FRACTION = 0.5 # Check sooner when at least this fraction of results changed
+SCHEDULE_SLACK_SECONDS = 1 # Timer ticks landing this early still count as due
+REQUERY_DISTANCE_FRACTION = 0.2 # Re-run geosearch only after moving this fraction of SEARCH_RADIUS_METERS
+MAX_RESULTS_AGE_SECONDS = 300 # ...or once the last geosearch is this old
+PREFETCH_ENABLED = True # Warm caches for where the user is heading before the next check
+PREDICTION_WINDOW_SECONDS = 120 # Location samples used to estimate speed and heading
+OPENAI_MODEL = "gpt-3.5-turbo" # Or "gpt-4" if available and preferred
+SUMMARY_PROMPT_VERSION = 1 # Bump when the summary prompts change to invalidate stored summaries
+SUMMARY_CACHE_KEY = f"{OPENAI_MODEL}/prompt-v{SUMMARY_PROMPT_VERSION}" # Summary store "model" key
+REVISION_CHECK_SECONDS = 300 # Revalidate lastrevid of cached geosearch results after this long
+SUMMARY_CACHE_PATH = os.environ.get(
+    "SUMMARY_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "summary_cache.sqlite3"),
+)
+SUMMARY_CACHE_MAX_ENTRIES = 10000
+SUMMARY_STORE_FLUSH_SECONDS = 30 # Summary store access times and hit counters are written back at most this often
+PAGE_CACHE_MAX_PAGES = 20000 # Pages whose summaries are held in memory for all sessions to render
+SUMMARY_SOURCE = os.environ.get("SUMMARY_SOURCE", "extracts") # "extracts": Wikipedia intro extracts, one API call per 20 pages; "llm": OpenAI summary per title
+CONDENSE_EXTRACTS = False # With "extracts", have OpenAI condense each extract to one sentence
+EXTRACT_SENTENCES = 2
+EXTRACTS_BATCH_SIZE = 20 # Max pageids per prop=extracts request
+EXTRACT_CACHE_MODEL = f"wikipedia-extract/{EXTRACT_SENTENCES}s" # Summary store "model" key for raw extracts
+THUMBNAIL_SIZE = 120 # Page image width in pixels
+SUMMARY_STRATEGY = os.environ.get("SUMMARY_STRATEGY", "batch") # "batch": one OpenAI request for all uncached titles; "concurrent": parallel per-title requests; "stream": per-title, rendered token by token; "serial": one at a time
+SUMMARY_MAX_WORKERS = 4 # Process-wide cap on concurrent per-title OpenAI requests on the tracking loop
+OPENAI_TIMEOUT_SECONDS = 15 # Per-request deadline
+OPENAI_REQUESTS_PER_MINUTE = int(os.environ.get("OPENAI_REQUESTS_PER_MINUTE", 500)) # Per process: divide the account limit by the replica count
+OPENAI_TOKENS_PER_MINUTE = int(os.environ.get("OPENAI_TOKENS_PER_MINUTE", 200000)) # Per process, prompt plus completion
+OPENAI_MAX_QUEUE = 100 # Summary requests waiting for budget beyond this are shed
+OPENAI_MAX_WAIT_SECONDS = 10 # ...as are requests that would wait longer than this
+SUMMARY_DEADLINE_SECONDS = 30 # Max time a tracking cycle waits on per-title summaries
+TRACKING_IO_WORKERS = 16 # Threads the tracking loop uses for blocking MediaWiki and SQLite calls
+CHECK_POLL_SECONDS = 1 # Panel timer while a check is running, so its progress renders without blocking a script thread
+CACHE_BACKEND_URL = os.environ.get("CACHE_BACKEND_URL") # Shared cache tier for multi-replica deployments: "redis://host:6379/0" or "sqlite:////shared/disk/cache.sqlite3"; unset = per-process caches only
+SHARED_CACHE_TIMEOUT_SECONDS = 0.5 # A slower shared tier counts as a miss
+SHARED_SUMMARY_TTL_SECONDS = 7 * 24 * 3600 # Bounds shared-tier size; summaries are keyed by revision, so never stale
+PROMETHEUS_PORT = os.environ.get("PROMETHEUS_PORT") # Serve /metrics on this port when prometheus_client is installed
+TIMING_WINDOW = 500 # Recent samples kept per stage for the debug sidebar
 
 # --- Check for OpenAI API Key ---
-openai_api_key = st.secrets.get("OPENAI_API_KEY")
+try:
+    openai_api_key = st.secrets.get("OPENAI_API_KEY")
+except FileNotFoundError: # No secrets.toml at all
+    openai_api_key = None
 if not openai_api_key:
     st.warning("OpenAI API Key not found in st.secrets. Summarization feature will be disabled.", icon="⚠️")
     openai_enabled = False
@@ -19,71 +86,989 @@ else:
     openai.api_key = openai_api_key
     openai_enabled = True
 
-# --- Helper Function for Wikipedia Geosearch (Same as before) ---
-def get_nearby_wikipedia_pages(latitude, longitude, radius_meters=1000, limit=5): # Limit results to reduce API calls
+# --- Geo Helpers ---
+def tile_for(latitude, longitude):
+    """Returns the (row, col) of the fixed-degree grid tile containing a point."""
+    step = TILE_SIZE_METERS / METERS_PER_DEGREE_LAT
+    return math.floor(latitude / step), math.floor(longitude / step)
+
+
+# --- Request Coalescing ---
+@st.cache_resource
+def get_single_flight():
+    return SingleFlight()
+
+
+# --- Shared Cache Tier ---
+@st.cache_resource
+def get_shared_cache():
+    """
+    Shared tier behind the in-process tile and page caches, so replicas behind
+    a load balancer don't each repeat the same upstream requests. None when
+    CACHE_BACKEND_URL is unset.
+    """
+    if not CACHE_BACKEND_URL:
+        return None
+    if CACHE_BACKEND_URL.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedCache(CACHE_BACKEND_URL, SHARED_CACHE_TIMEOUT_SECONDS)
+    if CACHE_BACKEND_URL.startswith("sqlite:///"):
+        return SQLiteSharedCache(CACHE_BACKEND_URL[len("sqlite:///"):])
+    raise ValueError(f"Unsupported CACHE_BACKEND_URL: {CACHE_BACKEND_URL}")
+
+
+# --- Geosearch Tile Cache ---
+class WikipediaAPIError(Exception):
+    """The MediaWiki API answered with an error payload."""
+
+
+@st.cache_resource
+def get_tile_cache():
+    return TileCache(TILE_TTL_SECONDS, TILE_CACHE_MAX_TILES)
+
+
+@st.cache_resource
+def get_geo_index():
+    return GeoIndex(GEO_INDEX_PATH)
+
+
+# --- Stage Timing ---
+@st.cache_resource
+def get_stage_timings():
+    timings = metrics.StageTimings(TIMING_WINDOW)
+    if PROMETHEUS_PORT:
+        metrics.serve(int(PROMETHEUS_PORT))
+    return timings
+
+
+# --- Result Churn ---
+@st.cache_resource
+def get_churn_stats():
+    return metrics.ChurnStats()
+
+
+# --- Pooled HTTP Session ---
+@st.cache_resource
+def get_http_session():
+    """
+    Process-wide keep-alive session for the MediaWiki API, so checks reuse
+    warm TCP/TLS connections instead of handshaking every time.
+    """
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False, # Hand the last response to raise_for_status for a clearer error
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": HTTP_USER_AGENT, "Accept-Encoding": "gzip"})
+    return session
+
+
+def get_http_stats():
+    """Requests sent vs. connections opened across the session's live pools."""
+    pools = get_http_session().get_adapter(WIKIPEDIA_API_URL).poolmanager.pools
+    stats = {"requests": 0, "connections": 0}
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is not None:
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+    return stats
+
+
+# --- Revision Tracking ---
+@st.cache_resource
+def get_revision_cache():
+    return RevisionCache()
+
+
+# --- Helper Functions for Wikipedia Geosearch ---
+def query_geosearch(latitude, longitude, radius_meters, limit):
     """
-    Queries the MediaWiki API to find Wikipedia pages near a given lat/lon.
-    Returns list of pages, empty list if none found, or None on error.
+    Raw MediaWiki geosearch request using generator=geosearch, so the same
+    round-trip also returns coordinates, revision ids, thumbnails and (for
+    result sets small enough for TextExtracts) intro extracts. Follows
+    `continue` until every prop is complete: pageimages returns at most 50
+    thumbnails per response, far fewer than a tile's pages.
+    Returns PageRecords, nearest first.
+    Raises on network, HTTP, decode or API errors.
     """
+    props = ["coordinates", "info", "pageimages"]
     params = {
         "action": "query",
-        "list": "geosearch",
-        "gsradius": radius_meters,
-        "gscoord": f"{latitude}|{longitude}",
-        "gslimit": limit, # Limit pages fetched
+        "generator": "geosearch",
+        "ggsradius": radius_meters,
+        "ggscoord": f"{latitude}|{longitude}",
+        "ggslimit": limit, # Limit pages fetched
+        "colimit": "max",
+        "codistancefrompoint": f"{latitude}|{longitude}",
+        "piprop": "thumbnail",
+        "pithumbsize": THUMBNAIL_SIZE,
+        "pilimit": "max",
         "format": "json",
         "formatversion": 2
     }
-    try:
-        response = requests.get(WIKIPEDIA_API_URL, params=params, timeout=10)
+    if limit <= EXTRACTS_BATCH_SIZE:
+        props.append("extracts")
+        params.update({"exintro": 1, "explaintext": 1, "exsentences": EXTRACT_SENTENCES, "exlimit": "max"})
+    params["prop"] = "|".join(props)
+    timings = get_stage_timings()
+    merged = {} # Page id -> page fields, merged across continuations
+    while True:
+        with timings.span("geosearch_http"):
+            response = get_http_session().get(WIKIPEDIA_API_URL, params=params, timeout=10)
+        response.raise_for_status()
+        with timings.span("json_decode"):
+            data = response.json()
+        if "error" in data:
+            raise WikipediaAPIError(data['error'].get('info', 'Unknown error'))
+        for page in data.get("query", {}).get("pages", []):
+            merged.setdefault(page["pageid"], {}).update(page)
+        if "continue" not in data:
+            break
+        params = {**params, **data["continue"]}
+
+    pages = []
+    for page in merged.values():
+        if not page.get("coordinates"):
+            continue
+        coordinates = page["coordinates"][0]
+        pages.append(PageRecord(
+            page["pageid"],
+            page["title"],
+            coordinates["lat"],
+            coordinates["lon"],
+            coordinates.get("dist", haversine_meters(latitude, longitude, coordinates["lat"], coordinates["lon"])),
+            page.get("lastrevid", 0),
+            page["thumbnail"]["source"] if page.get("thumbnail") else None,
+            page["extract"].strip() if page.get("extract") else None,
+        ))
+    pages.sort(key=lambda p: p.dist)
+    get_revision_cache().update({page.pageid: page.lastrevid for page in pages if page.lastrevid})
+    return pages
+
+
+def query_revisions(page_ids):
+    """
+    Current lastrevid for each page id via prop=info, 50 ids per request.
+    Raises on network, HTTP, decode or API errors.
+    """
+    revisions = {}
+    for start in range(0, len(page_ids), 50):
+        params = {
+            "action": "query",
+            "prop": "info",
+            "pageids": "|".join(str(page_id) for page_id in page_ids[start:start + 50]),
+            "format": "json",
+            "formatversion": 2
+        }
+        with get_stage_timings().span("revision_check_http"):
+            response = get_http_session().get(WIKIPEDIA_API_URL, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         if "error" in data:
-            st.error(f"Wikipedia API Error: {data['error'].get('info', 'Unknown error')}")
-            return None
-        return data.get("query", {}).get("geosearch", [])
-    except requests.exceptions.Timeout:
-        st.error("Wikipedia API request timed out.")
+            raise WikipediaAPIError(data['error'].get('info', 'Unknown error'))
+        for page in data.get("query", {}).get("pages", []):
+            if "lastrevid" in page:
+                revisions[page["pageid"]] = page["lastrevid"]
+    return revisions
+
+
+def validate_revisions(pages):
+    """
+    Refreshes lastrevid on pages whose revision hasn't been confirmed within
+    REVISION_CHECK_SECONDS, using one batched request. On failure the known
+    revisions are kept, so stored summaries keep being served.
+    """
+    cache = get_revision_cache()
+    stale = [page.pageid for page in pages if cache.get(page.pageid, REVISION_CHECK_SECONDS) is None]
+    if stale:
+        try:
+            cache.update(query_revisions(stale))
+        except (requests.exceptions.RequestException, ValueError, WikipediaAPIError):
+            pass
+    validated = []
+    for page in pages:
+        revision = cache.get(page.pageid, float('inf')) or page.lastrevid
+        validated.append(page if revision == page.lastrevid else page.replace(lastrevid=revision))
+    return validated
+
+
+def load_shared_tile(key):
+    """
+    A tile from the shared cache tier as (center, covered_radius, pages, fetched_at),
+    or None. The revisions it carries count as confirmed when it was fetched.
+    """
+    shared = get_shared_cache()
+    if shared is None:
         return None
-    except requests.exceptions.RequestException as e:
-        st.error(f"Network or API request failed: {e}")
+    tile_key = shared_key("tile", *key)
+    value = shared.get_many([tile_key]).get(tile_key)
+    if value is None:
         return None
-    except json.JSONDecodeError:
-        st.error("Failed to decode the response from Wikipedia API.")
+    try:
+        fetched_at, center, covered_radius, pages = json.loads(value)
+        pages = [PageRecord(*fields) for fields in pages]
+    except (ValueError, TypeError):
+        # Corrupt, or written by a replica with another layout
+        shared.errors += 1
         return None
+    get_revision_cache().update({page.pageid: page.lastrevid for page in pages if page.lastrevid}, fetched_at)
+    return tuple(center), covered_radius, pages, fetched_at
+
+
+def store_shared_tile(key, center, covered_radius, pages):
+    shared = get_shared_cache()
+    if shared is not None:
+        value = json.dumps([time.time(), center, covered_radius, [page.astuple() for page in pages]])
+        shared.set_many({shared_key("tile", *key): value}, TILE_TTL_SECONDS)
 
-# --- Helper Function for OpenAI Summarization ---
-@st.cache_data(ttl=3600) # Cache summaries for an hour to save API calls
-def get_openai_summary(page_title):
+
+def search_tile(latitude, longitude, radius_meters):
     """
-    Uses OpenAI API to get a brief summary of a Wikipedia page title.
+    Answers a geosearch from the tile cache, then the shared tier, fetching the
+    covering tile on a miss. Returns pages sorted by distance, or None if the
+    tile can't cover the query.
     """
-    if not openai_enabled:
-        return "OpenAI summarization disabled (API key missing)."
+    cache = get_tile_cache()
+    row, col = tile_for(latitude, longitude)
+    key = (row, col, radius_meters)
+    entry = cache.get(key)
+    if entry is None:
+        fetched = load_shared_tile(key)
+        if fetched is not None:
+            cache.put(key, *fetched)
+            entry = fetched[:3]
+    if entry is None:
+        step = TILE_SIZE_METERS / METERS_PER_DEGREE_LAT
+        center = ((row + 0.5) * step, (col + 0.5) * step)
+        half_diagonal = haversine_meters(*center, row * step, col * step)
+        fetch_radius = min(MAX_GEOSEARCH_RADIUS_METERS, math.ceil(half_diagonal + radius_meters))
+        pages = get_single_flight().do(("tile", key), query_geosearch, *center, fetch_radius, TILE_FETCH_LIMIT)
+        # A full page of results means the API truncated by distance: only trust up to the farthest one
+        covered_radius = fetch_radius if len(pages) < TILE_FETCH_LIMIT else max(p.dist for p in pages)
+        entry = (center, covered_radius, pages)
+        cache.put(key, *entry)
+        store_shared_tile(key, *entry)
+
+    center, covered_radius, pages = entry
+    if haversine_meters(latitude, longitude, *center) + radius_meters > covered_radius:
+        return None
+    return resort_by_distance(pages, latitude, longitude, radius_meters)
+
+
+def find_nearby_pages(latitude, longitude, radius_meters=1000, limit=5): # Limit results to reduce API calls
+    """
+    Finds Wikipedia pages near a given lat/lon, served from the offline index if
+    GEO_INDEX_PATH is set, otherwise from the tile cache when possible.
+    Returns a list of PageRecords, empty if none found. Makes no Streamlit calls;
+    raises on index, network, HTTP, decode or API errors.
+    """
+    if GEO_INDEX_PATH:
+        return [PageRecord.from_geosearch(page) for page in get_geo_index().query(latitude, longitude, radius_meters, limit)]
+
+    pages = search_tile(latitude, longitude, radius_meters)
+    if pages is None:
+        return query_geosearch(latitude, longitude, radius_meters, limit)[:limit]
+    # Tile entries can be up to TILE_TTL_SECONDS old; make sure summaries are keyed by the current revision
+    return validate_revisions(pages[:limit])
+
+
+def search_error_message(error):
+    """User-facing description of a find_nearby_pages failure."""
+    if isinstance(error, WikipediaAPIError):
+        return f"Wikipedia API Error: {error}"
+    if isinstance(error, requests.exceptions.Timeout):
+        return "Wikipedia API request timed out."
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"Network or API request failed: {error}"
+    if isinstance(error, json.JSONDecodeError):
+        return "Failed to decode the response from Wikipedia API."
+    if GEO_INDEX_PATH and isinstance(error, (OSError, ValueError)):
+        return f"Offline geo index unavailable: {error}"
+    return f"Geosearch failed: {type(error).__name__}"
+
+# --- Movement Gating ---
+def needs_requery(last_query, location):
+    """
+    Decides whether a new geosearch is worth it. Displacement within the
+    location's reported accuracy is treated as GPS jitter, not movement.
+    """
+    if last_query is None or time.time() - last_query['time'] > MAX_RESULTS_AGE_SECONDS:
+        return True
+    moved = haversine_meters(last_query['latitude'], last_query['longitude'], location['latitude'], location['longitude'])
+    return moved - (location.get('accuracy') or 0) >= REQUERY_DISTANCE_FRACTION * SEARCH_RADIUS_METERS
+
+
+def diff_results(previous, current):
+    """Page ids (kept, added, removed) going from one result list to the next."""
+    before = {page.pageid for page in previous}
+    after = {page.pageid for page in current}
+    return before & after, after - before, before - after
+
+
+def result_churn(previous, current):
+    """
+    Fraction of pages that appeared or disappeared between two result lists (0 = same set).
+    A first search (no previous results) counts as no churn.
+    """
+    if not previous:
+        return 0.0
+    kept, added, removed = diff_results(previous, current)
+    changed = len(added) + len(removed)
+    return changed / (changed + len(kept)) if changed else 0.0
+
+
+def resort_by_distance(pages, latitude, longitude, radius_meters):
+    """Recomputes distances of previous results from a new position, dropping any now out of range."""
+    nearby = []
+    for page in pages:
+        dist = haversine_meters(latitude, longitude, page.lat, page.lon)
+        if dist <= radius_meters:
+            nearby.append(page.replace(dist=dist))
+    nearby.sort(key=lambda p: p.dist)
+    return nearby
+
+
+# --- Predictive Prefetch ---
+def record_sample(history, sample_time, latitude, longitude):
+    """
+    Appends a (timestamp_seconds, lat, lon) fix to history, dropping samples
+    older than PREDICTION_WINDOW_SECONDS but always keeping the previous one:
+    checks can be up to MAX_REFRESH_SECONDS apart, and speed and heading need
+    two samples.
+    """
+    if not history or sample_time > history[-1][0]:
+        history.append((sample_time, latitude, longitude))
+    while len(history) > 2 and sample_time - history[0][0] > PREDICTION_WINDOW_SECONDS:
+        history.pop(0)
+
+
+def predict_position(history, horizon_seconds):
+    """
+    Extrapolates the user's track linearly from the oldest to the newest
+    (timestamp_seconds, lat, lon) sample. Returns (lat, lon) or None.
+    """
+    if len(history) < 2:
+        return None
+    (t0, lat0, lon0), (t1, lat1, lon1) = history[0], history[-1]
+    if t1 <= t0:
+        return None
+    scale = horizon_seconds / (t1 - t0)
+    return lat1 + (lat1 - lat0) * scale, lon1 + (lon1 - lon0) * scale
+
+
+def estimate_speed(history):
+    """Average speed in m/s over the (timestamp_seconds, lat, lon) samples, or None with fewer than two."""
+    if len(history) < 2:
+        return None
+    (t0, lat0, lon0), (t1, lat1, lon1) = history[0], history[-1]
+    if t1 <= t0:
+        return None
+    return haversine_meters(lat0, lon0, lat1, lon1) / (t1 - t0)
+
+
+# --- Adaptive Refresh ---
+def adapt_refresh_interval(interval, speed_mps, churn, failed):
+    """
+    Seconds until the next check. Failed checks (errors, 429s) back off
+    exponentially. Otherwise the target is the time to cover the requery
+    distance at the current speed, doubled while standing still and at most
+    halved while results churn. The result is MIN_REFRESH_SECONDS times a
+    power of two, clamped to MAX_REFRESH_SECONDS.
+    """
+    if failed:
+        target = interval * 2
+    else:
+        if speed_mps is None:
+            target = interval
+        elif speed_mps < STATIONARY_SPEED_MPS:
+            target = interval * 2
+        else:
+            target = REQUERY_DISTANCE_FRACTION * SEARCH_RADIUS_METERS / speed_mps
+        if churn >= CHURN_SPEEDUP_FRACTION:
+            target = min(target, interval / 2)
+    steps = round(math.log2(max(target, MIN_REFRESH_SECONDS) / MIN_REFRESH_SECONDS))
+    return min(MAX_REFRESH_SECONDS, MIN_REFRESH_SECONDS * 2 ** steps)
+
+
+# --- Persistent Summary Store ---
+@st.cache_resource
+def get_summary_store():
+    return SummaryStore(SUMMARY_CACHE_PATH, SUMMARY_CACHE_MAX_ENTRIES, get_shared_cache(),
+                        SHARED_SUMMARY_TTL_SECONDS, SUMMARY_STORE_FLUSH_SECONDS)
+
+
+# --- Shared Page Cache ---
+@st.cache_resource
+def get_page_cache():
+    return PageCache(PAGE_CACHE_MAX_PAGES)
+
+
+def summary_model():
+    """Summary store "model" key of the summaries shown for the configured SUMMARY_SOURCE."""
+    if SUMMARY_SOURCE != "extracts":
+        return SUMMARY_CACHE_KEY
+    return f"{SUMMARY_CACHE_KEY}:{EXTRACT_CACHE_MODEL}" if CONDENSE_EXTRACTS and openai_enabled else EXTRACT_CACHE_MODEL
 
-    try:
-        prompt = f"Briefly summarize the subject of the Wikipedia page titled '{page_title}' in one concise sentence."
 
+def summary_label(key):
+    """Source shown with a summary, from the model of its key rather than the current configuration."""
+    return "Wikipedia" if key[2] == EXTRACT_CACHE_MODEL else "AI Summary"
+
+
+def load_summary(key):
+    """Summary text for a key, from the page cache or else the summary store. None if neither has it."""
+    cache = get_page_cache()
+    summary = cache.get(key)
+    if summary is None:
+        with get_stage_timings().span("summary_cache_lookup"):
+            summary = get_summary_store().get(*key)
+        cache.update({key: summary})
+    return summary
+
+
+# --- Helper Functions for OpenAI Summarization ---
+SUMMARY_SYSTEM_PROMPT = "You are an assistant that summarizes Wikipedia page topics concisely."
+
+def summary_messages(page_title):
+    prompt = f"Briefly summarize the subject of the Wikipedia page titled '{page_title}' in one concise sentence."
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def stream_summary(page_id, page_title, revision=0, priority=0.0):
+    """
+    Yields summary text from a streaming chat completion as tokens arrive, and
+    stores the full summary once the stream completes. Raises on API errors,
+    or OpenAIRequestShed when over the rate limit.
+    """
+    messages = summary_messages(page_title)
+    get_tracking_engine().limiter.acquire_blocking(estimate_tokens(messages, 60), priority)
+    timings = get_stage_timings()
+    started = time.perf_counter()
+    stream = openai.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        max_tokens=60,
+        temperature=0.3,
+        stream=True,
+        timeout=OPENAI_TIMEOUT_SECONDS
+    )
+    parts = []
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            if not parts:
+                timings.observe("openai_first_token", time.perf_counter() - started)
+            parts.append(delta)
+            yield delta
+    timings.observe("openai_call", time.perf_counter() - started)
+    summary = "".join(parts).strip()
+    if summary:
+        get_summary_store().put(page_id, revision, SUMMARY_CACHE_KEY, summary)
+        get_page_cache().update({(page_id, revision, SUMMARY_CACHE_KEY): summary})
+
+
+# --- Wikipedia Extracts ---
+def query_extracts(page_ids):
+    """
+    Plain-text intro extracts for the given page ids, EXTRACTS_BATCH_SIZE ids
+    per request. Returns {page_id: extract}; raises on network or API errors.
+    """
+    extracts = {}
+    for start in range(0, len(page_ids), EXTRACTS_BATCH_SIZE):
+        chunk = page_ids[start:start + EXTRACTS_BATCH_SIZE]
+        params = {
+            "action": "query",
+            "prop": "extracts",
+            "exintro": 1,
+            "explaintext": 1,
+            "exsentences": EXTRACT_SENTENCES,
+            "exlimit": len(chunk),
+            "pageids": "|".join(str(page_id) for page_id in chunk),
+            "format": "json",
+            "formatversion": 2
+        }
+        timings = get_stage_timings()
+        with timings.span("extracts_http"):
+            response = get_http_session().get(WIKIPEDIA_API_URL, params=params, timeout=10)
+        response.raise_for_status()
+        with timings.span("json_decode"):
+            data = response.json()
+        if "error" in data:
+            raise WikipediaAPIError(data['error'].get('info', 'Unknown error'))
+        for page in data.get("query", {}).get("pages", []):
+            if page.get("extract"):
+                extracts[page["pageid"]] = page["extract"].strip()
+    return extracts
+
+
+def request_condensed_extract(extract, priority=0.0):
+    """Has OpenAI condense an extract to one sentence. Raises on API errors, or OpenAIRequestShed when over the rate limit."""
+    messages = [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Condense this Wikipedia introduction into one concise sentence:\n{extract}"}
+    ]
+    limiter = get_tracking_engine().limiter
+    estimated = estimate_tokens(messages, 60)
+    limiter.acquire_blocking(estimated, priority)
+    with get_stage_timings().span("openai_call"):
         response = openai.chat.completions.create(
-            model="gpt-3.5-turbo", # Or "gpt-4" if available and preferred
-            messages=[
-                {"role": "system", "content": "You are an assistant that summarizes Wikipedia page topics concisely."},
-                {"role": "user", "content": prompt}
-            ],
+            model=OPENAI_MODEL,
+            messages=messages,
             max_tokens=60,
-            temperature=0.3, # Lower temperature for more factual summary
-            timeout=15 # Add timeout for OpenAI call
+            temperature=0.3,
+            timeout=OPENAI_TIMEOUT_SECONDS
         )
-        summary = response.choices[0].message.content.strip()
+    if response.usage:
+        limiter.settle(estimated, response.usage.total_tokens)
+    return response.choices[0].message.content.strip()
+
+
+def load_extract_summaries(store, pages, priority_offset=0.0):
+    """
+    Extract-based summaries as {page_id: (model, summary)}, where model is the
+    summary store "model" key the summary is stored under (summary None where
+    Wikipedia has none). Uncached extracts are fetched in batched requests;
+    with CONDENSE_EXTRACTS they are also condensed by OpenAI, keeping the raw
+    extract under EXTRACT_CACHE_MODEL if that fails or is shed
+    (priority_offset is added to page distances for the rate limiter).
+    Makes no Streamlit calls; raises on Wikipedia API errors.
+    """
+    summaries = {}
+    missing = []
+    for page in pages:
+        if page.extract:
+            # Already delivered by the geosearch request itself
+            store.put(page.pageid, page.lastrevid, EXTRACT_CACHE_MODEL, page.extract)
+            summaries[page.pageid] = (EXTRACT_CACHE_MODEL, page.extract)
+            continue
+        with get_stage_timings().span("summary_cache_lookup"):
+            cached = store.get(page.pageid, page.lastrevid, EXTRACT_CACHE_MODEL)
+        if cached is not None:
+            summaries[page.pageid] = (EXTRACT_CACHE_MODEL, cached)
+        else:
+            missing.append(page)
+    if missing:
+        extracts = query_extracts([page.pageid for page in missing])
+        for page in missing:
+            extract = extracts.get(page.pageid)
+            if extract:
+                store.put(page.pageid, page.lastrevid, EXTRACT_CACHE_MODEL, extract)
+            summaries[page.pageid] = (EXTRACT_CACHE_MODEL, extract)
+
+    if CONDENSE_EXTRACTS and openai_enabled:
+        condensed_model = summary_model()
+        for page in pages:
+            _, extract = summaries.get(page.pageid, (None, None))
+            if not extract:
+                continue
+            condensed = store.get(page.pageid, page.lastrevid, condensed_model)
+            if condensed is None:
+                try:
+                    condensed = request_condensed_extract(extract, page.dist + priority_offset)
+                    store.put(page.pageid, page.lastrevid, condensed_model, condensed)
+                except Exception:
+                    continue # Shown as the raw extract; retried by the next cycle that still needs it
+            summaries[page.pageid] = (condensed_model, condensed)
+    return summaries
+
+
+# --- Tracking Engine ---
+class TrackingEngine:
+    """
+    Runs tracking cycles (geosearch, then summaries) as tasks on one asyncio
+    loop in a background thread shared by all sessions. Scripts submit a cycle
+    and pick up its result on a later rerun instead of waiting on the network.
+    OpenAI requests are native coroutines; MediaWiki and summary-store calls go
+    through the pooled HTTP session and SQLite on a bounded I/O pool.
+    """
+    def __init__(self, io_workers, openai_client):
+        self.openai = openai_client
+        self.loop = asyncio.new_event_loop()
+        self._io = concurrent.futures.ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="tracking-io")
+        self._openai_slots = asyncio.Semaphore(SUMMARY_MAX_WORKERS)
+        self.limiter = OpenAIRateLimiter(self.loop, OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE,
+                                         OPENAI_MAX_QUEUE, OPENAI_MAX_WAIT_SECONDS, get_stage_timings())
+        self._background = set()
+        self.lock = threading.Lock() # Guards the SessionTracker fields script threads share with the loop
+        threading.Thread(target=self.loop.run_forever, name="tracking-loop", daemon=True).start()
+
+    def spawn(self, coro):
+        """Starts a fire-and-forget task from the loop's thread, holding a reference until it finishes."""
+        task = self.loop.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def io(self, fn, *args):
+        return self.loop.run_in_executor(self._io, fn, *args)
+
+    async def run_cycle(self, latitude, longitude, limit=5, known=None, priority_offset=0.0, on_progress=None):
+        """
+        One tracking cycle. Returns the query position and time, the pages found
+        (None on error), {page_id: key into the page cache, or None if there is
+        no summary} for the pages summarized, and an error message for the panel
+        (None on success). known holds the keys from the previous cycle's
+        summaries: pages still at that revision keep their key, and pages the
+        page cache already holds aren't summarized again. priority_offset is
+        added to page distances for the OpenAI rate limiter. on_progress, if
+        given, is called with the result so far once the pages are found and
+        again as each summary lands.
+        """
+        result = {
+            "query": {'latitude': latitude, 'longitude': longitude, 'time': time.time()},
+            "pages": None,
+            "summaries": {},
+            "error": None,
+        }
+        try:
+            with get_stage_timings().span("geosearch"):
+                result["pages"] = await self.io(find_nearby_pages, latitude, longitude, SEARCH_RADIUS_METERS, limit)
+        except Exception as e:
+            result["error"] = search_error_message(e)
+            return result
+        pages = result["pages"]
+        # Inline extracts only feed the summary caches below; don't carry them around in session state
+        result["pages"] = [page.replace(extract=None) if page.extract else page for page in pages]
+        model = summary_model()
+        known = known or {}
+        carried = {page.pageid: known[page.pageid] for page in pages
+                   if known.get(page.pageid) and known[page.pageid] == page.summary_key(model)}
+        appeared = [page for page in pages if page.pageid not in carried]
+        cache = get_page_cache()
+        cached = cache.get_many(appeared, model)
+        # Known summaries are kept even if fetching the rest fails
+        result["summaries"] = carried
+        result["summaries"].update({page.pageid: page.summary_key(model) for page in appeared if page.pageid in cached})
+        uncached = [page for page in appeared if page.pageid not in cached]
+
+        def land(page, summary, produced_by):
+            # Keyed by the model that produced it, so a raw-extract fallback isn't carried over as condensed
+            cache.update({page.summary_key(produced_by): summary})
+            result["summaries"][page.pageid] = page.summary_key(produced_by) if summary else None
+            if on_progress is not None:
+                on_progress(result)
+
+        if on_progress is not None:
+            on_progress(result)
+        try:
+            if uncached:
+                await self.summarize(uncached, priority_offset, land)
+        except Exception as e:
+            result["error"] = f"Could not load summaries. Error: {type(e).__name__}"
+        return result
+
+    async def summarize(self, pages, priority_offset=0.0, on_summary=None):
+        """
+        Summaries keyed by page id for the configured SUMMARY_SOURCE, also
+        passed to on_summary(page, summary, model) as each one lands, model
+        being the summary store "model" key it belongs to. Pages left out
+        (streamed summaries, or ones past SUMMARY_DEADLINE_SECONDS) are looked
+        up or generated by the panel instead.
+        """
+        summaries = {}
+
+        def land(page, summary, model=SUMMARY_CACHE_KEY):
+            summaries[page.pageid] = summary
+            if on_summary is not None:
+                on_summary(page, summary, model)
+
+        store = get_summary_store()
+        if SUMMARY_SOURCE == "extracts":
+            extracts = await self.io(load_extract_summaries, store, pages, priority_offset)
+            for page in pages:
+                if page.pageid in extracts:
+                    model, summary = extracts[page.pageid]
+                    land(page, summary, model)
+            return summaries
+        if not openai_enabled or SUMMARY_STRATEGY == "stream":
+            return summaries
+
+        with get_stage_timings().span("summary_cache_lookup"):
+            keys = [(page.pageid, page.lastrevid) for page in pages]
+            stored = await self.io(store.get_many, keys, SUMMARY_CACHE_KEY)
+        for page in pages:
+            if page.pageid in stored:
+                land(page, stored[page.pageid])
+        uncached = {page.title: page for page in pages if page.pageid not in stored}
+        batch = {}
+        if SUMMARY_STRATEGY == "batch" and len(uncached) > 1:
+            try:
+                batch_key = ("batch", frozenset(uncached), SUMMARY_CACHE_KEY)
+                closest = min(page.dist for page in uncached.values()) + priority_offset
+                batch = await get_single_flight().do_async(batch_key, self.request_batch_summaries, list(uncached), closest)
+            except Exception:
+                batch = {} # Fall back to per-title requests below
+        for title, page in uncached.items():
+            if title in batch:
+                await self.io(store.put, page.pageid, page.lastrevid, SUMMARY_CACHE_KEY, batch[title])
+                land(page, batch[title])
+
+        remaining = [page for title, page in uncached.items() if title not in batch]
+        if SUMMARY_STRATEGY == "serial":
+            for page in remaining:
+                land(page, await self.summarize_page(store, page, page.dist + priority_offset))
+        elif remaining:
+            # Spawned so the engine holds them once the deadline below stops waiting
+            tasks = {self.spawn(self.summarize_page(store, page, page.dist + priority_offset)): page
+                     for page in remaining}
+            deadline = self.loop.time() + SUMMARY_DEADLINE_SECONDS
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - self.loop.time()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break # Unfinished tasks keep running and land in the store for the panel to pick up
+                for task in done:
+                    land(tasks[task], task.result())
+        return summaries
+
+    async def summarize_page(self, store, page, priority):
+        """Requests and stores one summary. Returns None on failure or when shed by the rate limiter."""
+        page_id, revision = page.pageid, page.lastrevid
+        try:
+            summary = await get_single_flight().do_async(
+                ("summary", page_id, revision, SUMMARY_CACHE_KEY), self.request_summary, page.title, priority
+            )
+        except Exception:
+            return None
+        await self.io(store.put, page_id, revision, SUMMARY_CACHE_KEY, summary)
         return summary
-    except openai.APITimeoutError:
-         st.warning(f"OpenAI request timed out for '{page_title}'.", icon="⏳")
-         return None
-    except Exception as e:
-        # Avoid showing full error details which might leak info
-        st.warning(f"Could not get OpenAI summary for '{page_title}'. Error: {type(e).__name__}", icon="⚠️")
-        # print(f"OpenAI Error for '{page_title}': {e}") # Optional: Log detailed error server-side
-        return None
+
+    async def request_summary(self, page_title, priority):
+        """Single-title OpenAI request. Raises on API errors, or OpenAIRequestShed when over the rate limit."""
+        messages = summary_messages(page_title)
+        estimated = estimate_tokens(messages, 60)
+        await self.limiter.acquire(estimated, priority)
+        async with self._openai_slots:
+            with get_stage_timings().span("openai_call"):
+                response = await self.openai.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=messages,
+                    max_tokens=60,
+                    temperature=0.3, # Lower temperature for more factual summary
+                    timeout=OPENAI_TIMEOUT_SECONDS
+                )
+        if response.usage:
+            self.limiter.settle(estimated, response.usage.total_tokens)
+        return response.choices[0].message.content.strip()
+
+    async def request_batch_summaries(self, page_titles, priority):
+        """
+        One OpenAI request for several titles, answered as a JSON object.
+        Returns {title: summary} for the titles the model answered; raises on
+        API or parse errors, or OpenAIRequestShed when over the rate limit.
+        """
+        prompt = (
+            "Briefly summarize the subject of each of the following Wikipedia page titles in one concise sentence. "
+            "Respond with a JSON object mapping each title, exactly as given, to its summary.\n"
+            + json.dumps(page_titles)
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        max_tokens = 60 * len(page_titles) + 20
+        estimated = estimate_tokens(messages, max_tokens)
+        await self.limiter.acquire(estimated, priority)
+        with get_stage_timings().span("openai_call"):
+            response = await self.openai.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=0.3,
+                response_format={"type": "json_object"},
+                timeout=OPENAI_TIMEOUT_SECONDS
+            )
+        if response.usage:
+            self.limiter.settle(estimated, response.usage.total_tokens)
+        parsed = json.loads(response.choices[0].message.content)
+        if not isinstance(parsed, dict):
+            raise ValueError("Batch summary response is not a JSON object")
+        return {
+            title: summary.strip()
+            for title, summary in parsed.items()
+            if title in page_titles and isinstance(summary, str) and summary.strip()
+        }
+
+
+@st.cache_resource
+def get_tracking_engine():
+    # Create the shared caches here: on the loop's threads there is no script run for cache_resource to report to
+    for get_shared in (get_stage_timings, get_churn_stats, get_single_flight, get_tile_cache, get_revision_cache,
+                       get_http_session, get_shared_cache, get_summary_store, get_page_cache):
+        get_shared()
+    if GEO_INDEX_PATH:
+        get_geo_index()
+    client = openai.AsyncOpenAI(api_key=openai_api_key) if openai_enabled else None
+    return TrackingEngine(TRACKING_IO_WORKERS, client)
+
+
+# --- Session Tracking Worker ---
+class SessionTracker:
+    """
+    Per-session tracking state. When the panel reports a location and a check
+    is due, the check runs as a task on the tracking loop and publishes
+    session-state updates that the panel drains on its next run. Movement gating
+    and prefetch happen there, between reruns; the panel never waits on a check.
+    Fields shared with the script thread are guarded by the engine's lock, so a
+    session costs no thread, task or lock of its own while idle.
+    """
+    __slots__ = ("engine", "busy", "updates", "next_check_at", "refresh_interval", "_location", "_task",
+                 "_last_query", "_last_results", "_summaries", "_history", "_prefetched_at")
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.busy = False # True from a due location report until its check has published everything
+        self.updates = None # Session-state fields published since the panel last drained, latest value wins
+        self.next_check_at = 0.0 # Epoch seconds when the next check becomes due
+        self.refresh_interval = REFRESH_INTERVAL_SECONDS # Adapted after every check
+        self._location = None
+        self._task = None # The running check
+        self._last_query = None # Position and time of the last geosearch
+        self._last_results = []
+        self._summaries = {} # Summary keys of _last_results, carried over for pages that stay in range
+        self._history = [] # (timestamp_seconds, lat, lon) samples for heading estimation
+        self._prefetched_at = None # Predicted position last prefetched
+
+    def report_location(self, location):
+        """
+        Hands the browser's latest fix to the tracker and starts a check if one is
+        due. Called from the script thread; returns True if a check was started.
+        """
+        with self.engine.lock:
+            self._location = location
+            due = not self.busy and time.time() >= self.next_check_at - SCHEDULE_SLACK_SECONDS
+            if due:
+                self.busy = True
+        if due:
+            self.engine.loop.call_soon_threadsafe(self._start)
+        return due
+
+    @property
+    def pending(self):
+        """True while a check is running or has updates the panel hasn't drained."""
+        return self.busy or self.updates is not None
+
+    def drain(self):
+        """Returns the session-state fields published since the last call."""
+        with self.engine.lock:
+            updates, self.updates = self.updates, None
+        return updates or {}
+
+    def publish(self, update):
+        """Merges a session-state update into those awaiting the panel's next run."""
+        with self.engine.lock:
+            if self.updates is None:
+                self.updates = {}
+            self.updates.update(update)
+
+    def stop(self):
+        self.engine.loop.call_soon_threadsafe(self._cancel)
+
+    def _start(self):
+        self._task = self.engine.spawn(self._run_check())
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run_check(self):
+        with self.engine.lock:
+            location = self._location
+        started = time.time()
+        try:
+            await self._check(location)
+        except Exception as e:
+            self.refresh_interval = adapt_refresh_interval(self.refresh_interval, None, 0.0, failed=True)
+            self.publish({"status_message": f"⚠️ Check failed ({type(e).__name__}). Waiting {self.refresh_interval}s..."})
+        finally:
+            self._task = None
+            with self.engine.lock:
+                self.next_check_at = started + self.refresh_interval
+                self.busy = False
+
+    async def _check(self, location):
+        lat = location['latitude']
+        lon = location['longitude']
+        sample_time = location.get('timestamp', time.time() * 1000) / 1000
+        history = self._history
+        record_sample(history, sample_time, lat, lon)
+        speed = estimate_speed(history)
+
+        previous = self._last_results
+        if not needs_requery(self._last_query, location):
+            # Barely moved: re-rank the previous results locally and keep their summaries
+            self._last_results = resort_by_distance(previous, lat, lon, SEARCH_RADIUS_METERS)
+            self.refresh_interval = adapt_refresh_interval(self.refresh_interval, speed, result_churn(previous, self._last_results), failed=False)
+            self.publish({
+                "last_results": self._last_results,
+                "status_message": f"✅ Barely moved; showing {len(self._last_results)} page(s) from the last search. Waiting {self.refresh_interval}s...",
+            })
+        else:
+            self.publish({"status_message": f"✅ Location acquired ({lat:.4f}, {lon:.4f}). Searching Wikipedia..."})
+
+            finished = False
+
+            def show_progress(result):
+                # Pages show as soon as they're found, and each summary as it lands. Summaries landing
+                # after the check finished (past SUMMARY_DEADLINE_SECONDS) go straight into the dict
+                # already published; republishing would put this check's status and pages back on screen
+                pages = result['pages']
+                if pages and not finished:
+                    self.publish({
+                        "last_results": pages,
+                        "summaries": dict(result['summaries']),
+                        "status_message": f"✅ Found {len(pages)} page(s). Summarizing...",
+                    })
+
+            result = await self.engine.run_cycle(lat, lon, known=self._summaries, on_progress=show_progress)
+            finished = True
+            nearby_pages = result['pages']
+            failed = result['error'] is not None
+            self.refresh_interval = adapt_refresh_interval(
+                self.refresh_interval, speed, result_churn(previous, nearby_pages or []), failed
+            )
+            waiting = f"Waiting {self.refresh_interval}s..."
+            # Pages still in range keep their summaries; only newly appeared ones were summarized
+            self._summaries = result['summaries']
+            update = {"summaries": self._summaries}
+            if nearby_pages is None:
+                self._last_results = []
+                update["last_results"] = []
+                update["status_message"] = f"⚠️ {result['error']} {waiting}"
+            else:
+                self._last_query = result['query']
+                self._last_results = nearby_pages
+                get_churn_stats().observe(*(len(ids) for ids in diff_results(previous, nearby_pages)))
+                update["last_results"] = nearby_pages
+                if not nearby_pages:
+                    update["status_message"] = f"⚪ No pages found within {SEARCH_RADIUS_METERS}m. {waiting}"
+                elif failed:
+                    update["status_message"] = f"⚠️ Found {len(nearby_pages)} page(s). {result['error']} {waiting}"
+                else:
+                    update["status_message"] = f"✅ Found {len(nearby_pages)} page(s). {waiting}"
+            self.publish(update)
+
+        # Prefetch where the user will be at the next check, so it finds warm caches
+        if PREFETCH_ENABLED:
+            predicted = predict_position(history, self.refresh_interval)
+            if predicted and haversine_meters(lat, lon, *predicted) >= REQUERY_DISTANCE_FRACTION * SEARCH_RADIUS_METERS:
+                last = self._prefetched_at
+                if last is None or haversine_meters(*last, *predicted) >= REQUERY_DISTANCE_FRACTION * SEARCH_RADIUS_METERS:
+                    # Result discarded; it only warms the caches. Its OpenAI requests queue behind any page on screen
+                    self.engine.spawn(self.engine.run_cycle(*predicted, priority_offset=SEARCH_RADIUS_METERS))
+                    self._prefetched_at = predicted
 
 
 # --- Initialize Session State ---
@@ -98,7 +1083,9 @@ if 'status_message' not in st.session_state:
 if 'error_message' not in st.session_state:
     st.session_state.error_message = None
 if 'summaries' not in st.session_state:
-     st.session_state.summaries = {} # Store summaries {page_id: summary_text}
+     st.session_state.summaries = {} # {page_id: key into the page cache, or None if unavailable}
+if 'tracker' not in st.session_state:
+    st.session_state.tracker = None # SessionTracker while tracking
 
 
 # --- Streamlit App UI ---
@@ -107,13 +1094,11 @@ st.title("🚶 Live Nearby Wikipedia Finder with AI Summaries")
 
 st.markdown(f"""
 Press 'Start Tracking' to automatically check for nearby Wikipedia pages
-every **{REFRESH_INTERVAL_SECONDS} seconds** using your current browser location.
-If pages are found and OpenAI is configured, AI summaries will be generated.
+every **{MIN_REFRESH_SECONDS}–{MAX_REFRESH_SECONDS} seconds** (sooner the faster you move) using your current browser location.
+Each page is shown with its Wikipedia introduction (or an AI summary, if configured).
 """)
-st.warning(f"""
-🔴 **Warning:** This app uses a method (`time.sleep`) that may make the
-UI unresponsive during the {REFRESH_INTERVAL_SECONDS}-second wait period between checks.
-Also, frequent AI summaries may incur OpenAI API costs.
+st.warning("""
+🔴 **Warning:** Frequent AI summaries may incur OpenAI API costs.
 """)
 
 
@@ -128,6 +1113,9 @@ with col1:
         st.session_state.last_results = []
         st.session_state.last_location = None
         st.session_state.summaries = {} # Clear summaries on start
+        if st.session_state.tracker is not None:
+            st.session_state.tracker.stop()
+        st.session_state.tracker = SessionTracker(get_tracking_engine())
         st.rerun()                 # New line
 
 with col2:
@@ -135,128 +1123,180 @@ with col2:
         st.session_state.running = False
         st.session_state.status_message = "Tracking stopped by user."
         st.session_state.error_message = None
+        if st.session_state.tracker is not None:
+            st.session_state.tracker.stop()
+            st.session_state.tracker = None
         st.rerun()
 
-# --- Display Status and Errors ---
-if st.session_state.error_message:
-    st.error(st.session_state.error_message)
+# --- Tracking Panel ---
+# Rendered as a fragment: while tracking, the run_every timer reruns only this
+# panel, so no script thread is held between checks. Each run reports the
+# location and renders whatever the session's tracking worker has published,
+# without waiting on the check. The timer ticks every CHECK_POLL_SECONDS while
+# a check is in flight and follows the worker's adaptive interval otherwise; a
+# new timer only takes effect in a full run.
+def panel_timer(tracker):
+    if tracker is None:
+        return REFRESH_INTERVAL_SECONDS
+    return CHECK_POLL_SECONDS if tracker.pending else tracker.refresh_interval
 
-st.info(st.session_state.status_message)
+panel_interval = panel_timer(st.session_state.tracker)
 
-# --- Display Last Known Info ---
-results_placeholder = st.container()
-with results_placeholder:
-    # Display Location
-    if st.session_state.last_location:
-        try:
-            loc = st.session_state.last_location
-            ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(loc['timestamp']/1000))
-            st.write(f"📍 Last known location: Lat={loc['latitude']:.5f}, Lon={loc['longitude']:.5f} (Accuracy: {loc.get('accuracy')}m) at {ts}")
-        except Exception:
-             st.write(f"📍 Last known location data: {st.session_state.last_location}")
-
-    # Display Results and Summaries
-    if st.session_state.last_results:
-        st.success(f"✅ Found **{len(st.session_state.last_results)}** recognized Wikipedia page(s):")
-        for page in st.session_state.last_results:
-            page_id = page.get('pageid')
-            title = page.get('title', 'N/A')
-            distance = page.get('dist', 'N/A')
-            wiki_url = f"https://en.wikipedia.org/?curid={page_id}"
-
-            col_link, col_summary = st.columns([2,3]) # Layout columns for link and summary
-
-            with col_link:
-                st.markdown(f"**[{title}]({wiki_url})**")
-                st.caption(f"Distance: {distance:.1f}m")
-
-            with col_summary:
-                # Check if summary already generated and stored, or generate it
-                if page_id in st.session_state.summaries:
-                    summary = st.session_state.summaries[page_id]
-                    if summary:
-                         st.info(f"**AI Summary:** {summary}")
-                    else:
-                         st.caption("Summary not available.")
-                elif openai_enabled: # Only try to generate if not already stored and openai is enabled
-                    with st.spinner(f"Generating summary for '{title}'..."):
-                        summary = get_openai_summary(title)
-                        st.session_state.summaries[page_id] = summary # Store summary (even if None)
-                        if summary:
-                            st.info(f"**AI Summary:** {summary}")
-                        else:
-                            st.caption("Could not retrieve summary.")
-                else:
-                     st.caption("OpenAI Summaries disabled.") # Show if OpenAI is off
+@st.fragment(run_every=panel_interval if st.session_state.running else None)
+def tracking_panel():
+    display = st.container() # Filled last, so it shows the outcome of this run's check
+    tracker = st.session_state.tracker
 
-            st.divider() # Separator between entries
+    # --- Main Execution Loop ---
+    if st.session_state.running:
+        # 1. Get Location
+        location_data = streamlit_geolocation() # CORRECT
 
-    elif st.session_state.running:
-        st.write("⚪ No pages found nearby at the last check.")
+        current_location = None
+        if (location_data and
+            'latitude' in location_data and
+            location_data['latitude'] is not None and # Add this check
+            'longitude' in location_data and
+            location_data['longitude'] is not None): # Add this check
+            current_location = location_data
+            st.session_state.last_location = current_location
+            st.session_state.error_message = None
+            if tracker is None:
+                st.session_state.tracker = tracker = SessionTracker(get_tracking_engine())
+            if tracker.report_location(current_location) and current_location.get('timestamp'):
+                # How stale the browser's fix is by the time the script sees it
+                get_stage_timings().observe("geolocation_age", max(0.0, time.time() - current_location['timestamp'] / 1000))
 
+        elif location_data and 'error' in location_data:
+            st.session_state.error_message = f"🚫 Geolocation Error: {location_data['error']['message']} (Code: {location_data['error']['code']}). Tracking stopped."
+            st.session_state.status_message = "Tracking stopped due to location error."
+            st.session_state.running = False
+            if tracker is not None:
+                tracker.stop()
+                st.session_state.tracker = None
+            st.rerun()
 
-# --- Main Execution Loop ---
-if st.session_state.running:
-    # 1. Get Location
-    location_data = streamlit_geolocation() # CORRECT
+        elif not location_data and st.session_state.running:
+             st.session_state.status_message = "⏳ Waiting for browser location permission/data..."
+             # Let component handle rerun
 
-    current_location = None
-    if (location_data and
-        'latitude' in location_data and
-        location_data['latitude'] is not None and # Add this check
-        'longitude' in location_data and
-        location_data['longitude'] is not None): # Add this check
-        current_location = location_data
-        st.session_state.last_location = current_location
-        st.session_state.error_message = None
-        st.session_state.status_message = f"✅ Location acquired ({current_location['latitude']:.4f}, {current_location['longitude']:.4f}). Searching Wikipedia..."
-        if not st.session_state.get('status_updated', False):
-            st.session_state.status_updated = True
-            st.rerun()
+    # --- Apply Worker Updates ---
+    if tracker is not None:
+        for field, value in tracker.drain().items():
+            st.session_state[field] = value
 
-    elif location_data and 'error' in location_data:
-        st.session_state.error_message = f"🚫 Geolocation Error: {location_data['error']['message']} (Code: {location_data['error']['code']}). Tracking stopped."
-        st.session_state.status_message = "Tracking stopped due to location error."
-        st.session_state.running = False
-        st.session_state.status_updated = False
-        st.rerun()
+    with display:
+        # --- Display Status and Errors ---
+        if st.session_state.error_message:
+            st.error(st.session_state.error_message)
 
-    # 2. Search Wikipedia & Trigger Summaries (if location obtained and status updated)
-    if current_location and st.session_state.get('status_updated', False):
-        lat = current_location['latitude']
-        lon = current_location['longitude']
-        nearby_pages = get_nearby_wikipedia_pages(lat, lon, SEARCH_RADIUS_METERS)
+        st.info(st.session_state.status_message)
+        if tracker is not None and tracker.next_check_at > time.time():
+            st.caption(f"⏳ Next check in {tracker.next_check_at - time.time():.0f} seconds...")
 
-        # Clear old summaries before adding new ones for the current results
-        st.session_state.summaries = {}
+        # --- Display Last Known Info ---
+        render_started = time.perf_counter()
+        results_placeholder = st.container()
+        with results_placeholder:
+            # Display Location
+            if st.session_state.last_location:
+                try:
+                    loc = st.session_state.last_location
+                    ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(loc['timestamp']/1000))
+                    st.write(f"📍 Last known location: Lat={loc['latitude']:.5f}, Lon={loc['longitude']:.5f} (Accuracy: {loc.get('accuracy')}m) at {ts}")
+                except Exception:
+                     st.write(f"📍 Last known location data: {st.session_state.last_location}")
+
+            # Display Results and Summaries
+            if st.session_state.last_results:
+                st.success(f"✅ Found **{len(st.session_state.last_results)}** recognized Wikipedia page(s):")
+                for page in st.session_state.last_results:
+                    page_id = page.pageid
+                    title = page.title
+                    distance = page.dist
+                    wiki_url = f"https://en.wikipedia.org/?curid={page_id}"
+
+                    col_link, col_summary = st.columns([2,3]) # Layout columns for link and summary
+
+                    with col_link:
+                        if page.thumbnail:
+                            st.image(page.thumbnail, width=THUMBNAIL_SIZE)
+                        st.markdown(f"**[{title}]({wiki_url})**")
+                        st.caption(f"Distance: {distance:.1f}m")
+
+                    with col_summary:
+                        # Summaries arrive with the cycle's results; only streamed ones are generated here
+                        if page_id in st.session_state.summaries:
+                            key = st.session_state.summaries[page_id]
+                            summary = load_summary(key) if key else None
+                            if summary:
+                                 st.info(f"**{summary_label(key)}:** {summary}")
+                            else:
+                                 st.caption("Summary not available.")
+                        elif SUMMARY_SOURCE == "extracts":
+                            st.caption("Summary not available.")
+                        elif not openai_enabled:
+                             st.caption("OpenAI Summaries disabled.") # Show if OpenAI is off
+                        elif SUMMARY_STRATEGY == "stream":
+                            key = page.summary_key(SUMMARY_CACHE_KEY)
+                            summary = load_summary(key)
+                            if summary:
+                                st.info(f"**AI Summary:** {summary}")
+                            else:
+                                try:
+                                    summary = st.write_stream(stream_summary(page_id, title, page.lastrevid, distance)).strip() or None
+                                except Exception as e:
+                                    st.warning(f"Could not get OpenAI summary for '{title}'. Error: {type(e).__name__}", icon="⚠️")
+                            st.session_state.summaries[page_id] = key if summary else None
+                        else:
+                            # Still running on the tracking loop when the cycle hit SUMMARY_DEADLINE_SECONDS
+                            key = page.summary_key(SUMMARY_CACHE_KEY)
+                            summary = load_summary(key)
+                            if summary:
+                                st.session_state.summaries[page_id] = key
+                                st.info(f"**AI Summary:** {summary}")
+                            else:
+                                st.caption("⏳ Summary still pending...")
+
+                    st.divider() # Separator between entries
+
+            elif st.session_state.running:
+                st.write("⚪ No pages found nearby at the last check.")
+        get_stage_timings().observe("render", time.perf_counter() - render_started)
+
+    # 2. A check started or finished, or the interval adapted: a full run resets the fragment's timer
+    if st.session_state.running and panel_timer(tracker) != panel_interval:
+        st.rerun(scope="app")
+
+
+tracking_panel()
 
-        if nearby_pages is not None:
-            st.session_state.last_results = nearby_pages
-            if not nearby_pages:
-                st.session_state.status_message = f"⚪ No pages found within {SEARCH_RADIUS_METERS}m. Waiting {REFRESH_INTERVAL_SECONDS}s..."
-            else:
-                 # Summaries will be generated during the results display phase on the next rerun
-                 st.session_state.status_message = f"✅ Found {len(nearby_pages)} page(s). Waiting {REFRESH_INTERVAL_SECONDS}s..."
-        else:
-             st.session_state.status_message = f"⚠️ Error searching Wikipedia. Waiting {REFRESH_INTERVAL_SECONDS}s..."
-             st.session_state.last_results = []
-
-        # 3. Wait and Schedule Rerun
-        countdown_placeholder = st.empty()
-        for i in range(REFRESH_INTERVAL_SECONDS, 0, -1):
-            countdown_placeholder.write(f"⏳ Next check in {i} seconds...")
-            time.sleep(1)
-        countdown_placeholder.empty()
-
-        st.session_state.status_updated = False
-        st.write("State before final rerun:", st.session_state) # Add this line
-        st.rerun()
 
-    elif not location_data and st.session_state.running:
-         st.session_state.status_message = "⏳ Waiting for browser location permission/data..."
-         # Let component handle rerun
+# --- Debug Sidebar ---
+if st.sidebar.checkbox("Show stage timings"):
+    st.sidebar.dataframe(get_stage_timings().summary(), hide_index=True)
+    if openai_enabled:
+        limiter = get_tracking_engine().limiter
+        st.sidebar.caption(f"OpenAI rate limiter: {limiter.granted} granted, {limiter.shed} shed, "
+                           f"queue depth {limiter.depth} (max {limiter.max_depth}).")
+    if metrics.prometheus_client is not None and PROMETHEUS_PORT:
+        st.sidebar.caption(f"Prometheus metrics on port {PROMETHEUS_PORT}.")
 
 
 # --- Add Footer ---
 st.markdown("---")
-st.caption(f"Using MediaWiki Geosearch API, OpenAI ({'Enabled' if openai_enabled else 'Disabled'}), & `streamlit-geolocation`. Radius: {SEARCH_RADIUS_METERS}m. Interval: {REFRESH_INTERVAL_SECONDS}s.")
+st.caption(f"Using {'offline geo index' if GEO_INDEX_PATH else 'MediaWiki Geosearch API'}, OpenAI ({'Enabled' if openai_enabled else 'Disabled'}), & `streamlit-geolocation`. Radius: {SEARCH_RADIUS_METERS}m. Interval: {st.session_state.tracker.refresh_interval if st.session_state.tracker else REFRESH_INTERVAL_SECONDS}s.")
+tile_cache = get_tile_cache()
+http_stats = get_http_stats()
+st.caption(f"Geosearch tile cache: {tile_cache.hits} hits / {tile_cache.misses} misses. HTTP: {http_stats['requests']} requests over {http_stats['connections']} connections.")
+single_flight = get_single_flight()
+st.caption(f"Coalesced lookups: {single_flight.coalesced} joined {single_flight.leaders} in-flight requests.")
+page_cache = get_page_cache()
+st.caption(f"Page cache: {page_cache.hits} hits / {page_cache.misses} misses across sessions.")
+churn = get_churn_stats()
+st.caption(f"Result churn: {churn.kept} pages kept, {churn.added} added, {churn.removed} dropped over {churn.searches} searches ({churn.churn():.0%} changed).")
+cache_stats = get_summary_store().stats()
+st.caption(f"Summary cache: {cache_stats['entries']} entries, {cache_stats['hits']} hits / {cache_stats['misses']} misses, {cache_stats['errors']} errors.")
+shared_cache = get_shared_cache()
+if shared_cache is not None:
+    st.caption(f"Shared cache tier ({type(shared_cache).__name__}): {shared_cache.hits} hits / {shared_cache.misses} misses, {shared_cache.errors} errors.")
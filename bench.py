@@ -0,0 +1,662 @@
+"""
+End-to-end benchmark: drives app.py (location -> geosearch -> summarization -> render)
+through Streamlit's AppTest against local stand-ins for the MediaWiki geosearch API
+and the OpenAI chat completions API.
+
+Usage:
+    python bench.py --sessions 20 --cycles 5 --wiki-latency 80 --openai-latency 600 --openai-jitter 200
+    python bench.py --cycles 3 --summary-source llm --memory-sessions 1000 10000
+    python bench.py --sessions 8 --start-spread 0.001 --step-seconds 30 --summary-source llm --cache-backend redis --replicas 1 2 4 8
+    python bench.py --cycles 3 --summary-source llm --capacity 5 10 20 40
+"""
+import argparse
+import heapq
+import json
+import math
+import multiprocessing
+import os
+import random
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from geo_index import METERS_PER_DEGREE_LAT, haversine_meters
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+# --- Fault Injection ---
+class UpstreamProfile:
+    """
+    Latency, jitter and streamed-token interval (all in ms) and error rate of a
+    stand-in server, plus request counters.
+    """
+    def __init__(self, latency_ms, jitter_ms, error_rate, seed, token_interval_ms=0):
+        self.latency_ms = latency_ms
+        self.token_interval_ms = token_interval_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay_and_roll(self):
+        """Sleeps for one sampled latency and returns True if this request should fail."""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self._rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            failed = self._rng.random() < self.error_rate
+            self.errors += failed
+        time.sleep(delay)
+        return failed
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass # Worker processes exit with keep-alive connections, or requests, still open
+
+    def log_message(self, format, *args):
+        pass
+
+
+# --- Fake MediaWiki Geosearch ---
+def make_wiki_handler(profile, spacing_meters):
+    """
+    Geosearch over a synthetic world with one page every spacing_meters on a
+    fixed-degree grid, so every session and tile sees the same page ids.
+    Also answers prop=extracts and prop=info for any page id it has handed out.
+    """
+    step = spacing_meters / METERS_PER_DEGREE_LAT
+
+    class WikiHandler(_JSONHandler):
+        titles = {}
+
+        def do_GET(self):
+            if profile.delay_and_roll():
+                self.send_json(503, {"error": {"code": "unavailable", "info": "Injected failure"}})
+                return
+            params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            if params.get("prop") == "info":
+                pages = [{"pageid": int(i), "title": self.titles.get(int(i), f"Page {i}"), "lastrevid": int(i) % 100000 + 1}
+                         for i in params["pageids"].split("|")]
+                self.send_json(200, {"batchcomplete": True, "query": {"pages": pages}})
+                return
+            if params.get("prop") == "extracts":
+                pages = [{"pageid": int(i), "title": self.titles.get(int(i), f"Page {i}"),
+                          "extract": f"{self.titles.get(int(i), 'This page')} is a synthetic landmark used for benchmarking."}
+                         for i in params["pageids"].split("|")]
+                self.send_json(200, {"batchcomplete": True, "query": {"pages": pages}})
+                return
+            generator = params.get("generator") == "geosearch"
+            prefix = "ggs" if generator else "gs"
+            lat, lon = (float(x) for x in params[f"{prefix}coord"].split("|"))
+            radius = float(params[f"{prefix}radius"])
+            limit = int(params.get(f"{prefix}limit", 10))
+            span = math.ceil(radius / spacing_meters) + 1
+            row0, col0 = round(lat / step), round(lon / step)
+            pages = []
+            for row in range(row0 - span, row0 + span + 1):
+                for col in range(col0 - span, col0 + span + 1):
+                    plat, plon = row * step, col * step
+                    dist = haversine_meters(lat, lon, plat, plon)
+                    if dist <= radius:
+                        page_id = (row & 0xFFFFF) << 20 | (col & 0xFFFFF)
+                        self.titles[page_id] = f"Landmark {row}/{col}"
+                        pages.append({"pageid": page_id, "ns": 0, "title": self.titles[page_id],
+                                      "lat": plat, "lon": plon, "dist": round(dist, 1), "primary": True})
+            pages.sort(key=lambda p: p["dist"])
+            pages = pages[:limit]
+            if not generator:
+                self.send_json(200, {"batchcomplete": True, "query": {"geosearch": pages}})
+                return
+            with_extracts = "extracts" in params.get("prop", "")
+            self.send_json(200, {"batchcomplete": True, "query": {"pages": [
+                {"pageid": p["pageid"], "ns": 0, "title": p["title"], "lastrevid": p["pageid"] % 100000 + 1,
+                 "coordinates": [{"lat": p["lat"], "lon": p["lon"], "primary": True, "globe": "earth", "dist": p["dist"]}],
+                 **({"extract": f"{p['title']} is a synthetic landmark used for benchmarking."} if with_extracts else {})}
+                for p in pages
+            ]}})
+
+    return WikiHandler
+
+
+# --- Fake OpenAI Chat Completions ---
+def make_openai_handler(profile):
+    class OpenAIHandler(_JSONHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if profile.delay_and_roll():
+                self.send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+                return
+            prompt = request["messages"][-1]["content"]
+            if request.get("response_format", {}).get("type") == "json_object":
+                titles = json.loads(prompt.rsplit("\n", 1)[-1])
+                content = json.dumps({t: f"{t} is a synthetic landmark used for benchmarking." for t in titles})
+            else:
+                content = "A synthetic landmark used for benchmarking."
+            if request.get("stream"):
+                self.send_stream(request["model"], content)
+                return
+            self.send_json(200, {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                          "total_tokens": (len(prompt) + len(content)) // 4},
+            })
+
+        def send_stream(self, model, content):
+            """Server-sent events, one chunk per word, over chunked transfer encoding."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                                                      "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                time.sleep(profile.token_interval_ms / 1000)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    return OpenAIHandler
+
+
+def _serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Fake Redis ---
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """
+    Minimal Redis-protocol server (HELLO, GET, MGET, SET [EX], PING) standing in for the
+    app's shared cache tier. Counts key hits and misses server-side, across all
+    replicas.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RedisHandler)
+        self.lock = threading.Lock()
+        self.reset()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+            self.hits = 0
+            self.misses = 0
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.values.get(key)
+            if entry and entry[1] < time.time():
+                del self.values[key]
+                entry = None
+            self.hits += entry is not None
+            self.misses += entry is None
+        return entry[0] if entry else None
+
+    def execute(self, args, resp3):
+        name = args[0].upper()
+        if name == b"GET":
+            return _bulk(self.lookup(args[1]), resp3)
+        if name == b"MGET":
+            return b"*%d\r\n" % (len(args) - 1) + b"".join(_bulk(self.lookup(key), resp3) for key in args[1:])
+        if name == b"SET":
+            ttl = int(args[4]) if len(args) >= 5 and args[3].upper() == b"EX" else 10 ** 9
+            with self.lock:
+                self.values[args[1]] = (args[2], time.time() + ttl)
+            return b"+OK\r\n"
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"HELLO":
+            # Protocol handshake sent by redis-py 8 on connect
+            fields = [b"server", b"redis", b"version", b"7.2.0", b"proto"]
+            return b"%3\r\n" + b"".join(_bulk(field, resp3) for field in fields) + b":%d\r\n" % (3 if resp3 else 2)
+        if name in (b"CLIENT", b"SELECT"):
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+
+def _bulk(value, resp3):
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        resp3 = False
+        try:
+            while True:
+                header = self.rfile.readline()
+                if not header:
+                    return
+                args = []
+                for _ in range(int(header[1:])):
+                    size = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(size + 2)[:-2])
+                if args[0].upper() == b"HELLO" and len(args) > 1:
+                    resp3 = args[1] == b"3"
+                self.wfile.write(self.server.execute(args, resp3))
+        except ConnectionResetError:
+            pass
+
+
+# --- App Driver ---
+def _install_probes():
+    """
+    Replaces the geolocation component with one that reports st.session_state.bench_location
+    and counts panel runs, and timestamps the first results header of each run, both in
+    st.session_state.bench_marks.
+    """
+    import streamlit as st
+    import streamlit_geolocation
+
+    def geolocation():
+        # Called once per tracking-panel run, so it also counts script executions per cycle
+        marks = st.session_state.get("bench_marks")
+        if marks is not None:
+            marks["panel_runs"] = marks.get("panel_runs", 0) + 1
+        return st.session_state.get("bench_location")
+
+    streamlit_geolocation.streamlit_geolocation = geolocation
+    success = st.success
+
+    def timed_success(body, *args, **kwargs):
+        marks = st.session_state.get("bench_marks")
+        if marks is not None and "first_result" not in marks and str(body).startswith("✅ Found"):
+            marks["first_result"] = time.perf_counter()
+        return success(body, *args, **kwargs)
+
+    st.success = timed_success
+
+
+def _run_session(index, args):
+    """
+    Runs one simulated session; returns the AppTest and (time-to-first-result,
+    time-to-all-summaries, panel runs, seconds spent in script runs, refresh
+    interval) per cycle.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(args.seed + index)
+    lat = args.latitude + rng.uniform(-args.start_spread, args.start_spread)
+    lon = args.longitude + rng.uniform(-args.start_spread, args.start_spread)
+    heading = rng.uniform(0, 2 * math.pi)
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    at.secrets["OPENAI_API_KEY"] = "sk-bench"
+    at.run()
+    # Fix timestamps: wall clock, or one step every --step-seconds ending now, so speed estimates stay realistic
+    clock = time.time() - args.step_seconds * args.cycles
+    samples = []
+    for cycle in range(args.cycles):
+        lat += args.step_meters * math.cos(heading) / METERS_PER_DEGREE_LAT
+        lon += args.step_meters * math.sin(heading) / (METERS_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+        fix_time = clock + args.step_seconds * (cycle + 1) if args.step_seconds else time.time()
+        at.session_state["bench_location"] = {"latitude": lat, "longitude": lon, "accuracy": 5,
+                                              "timestamp": fix_time * 1000}
+        at.session_state["bench_marks"] = {}
+        if at.session_state["tracker"] is not None:
+            at.session_state["tracker"].next_check_at = 0.0 # Due now
+        start = time.perf_counter()
+        if cycle == 0:
+            at.button[0].click()
+        at.run()
+        script_seconds = time.perf_counter() - start
+        while not at.exception and at.session_state["tracker"].pending:
+            # Stands in for the panel's run_every timer while the check runs on the tracking worker
+            time.sleep(args.poll_interval / 1000)
+            run_start = time.perf_counter()
+            at.run()
+            script_seconds += time.perf_counter() - run_start
+        done = time.perf_counter()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        marks = at.session_state["bench_marks"]
+        samples.append((marks.get("first_result", done) - start, done - start, marks.get("panel_runs", 0),
+                        script_seconds, at.session_state["tracker"].refresh_interval))
+    return at, samples
+
+
+def _run_worker(session_indices, args):
+    """
+    Worker process entry point. AppTest swaps process-global state on every run,
+    so each worker drives its sessions one at a time; concurrency comes from the
+    number of workers.
+    """
+    _install_probes()
+    if args.replicas:
+        # Each replica is its own host: a private summary store, shared state only through CACHE_BACKEND_URL
+        os.environ["SUMMARY_CACHE_PATH"] += f".{os.getpid()}"
+    start = time.time()
+    samples = [sample for index in session_indices for sample in _run_session(index, args)[1]]
+    return samples, start, time.time()
+
+
+# --- Script Thread Capacity ---
+def _run_capacity(count, args):
+    """
+    Worker process entry point for --capacity. The process stands in for one
+    script thread: AppTest runs one script at a time, like a thread, so count
+    sessions take turns on it. Each session is rerun when its panel timer
+    fires (--poll-interval while its check is in flight, its refresh interval
+    otherwise), counted from the end of its previous run; a run that's due
+    while another one executes waits for it. Sessions start at random within
+    30s (the app's initial refresh interval) and walk at --walk-speed until
+    they have done args.cycles checks. Returns how late each check started after it was due
+    (seconds), the number of runs, the seconds spent in runs and the elapsed time.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    _install_probes()
+    rng = random.Random(args.seed)
+    sessions = []
+    for index in range(count):
+        at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+        at.secrets["OPENAI_API_KEY"] = "sk-bench"
+        at.run()
+        sessions.append({
+            "at": at,
+            "origin": (args.latitude + rng.uniform(-args.start_spread, args.start_spread),
+                       args.longitude + rng.uniform(-args.start_spread, args.start_spread)),
+            "heading": rng.uniform(0, 2 * math.pi),
+            "checks": 0,
+        })
+    started = time.time()
+    due = [(started + rng.uniform(0, 30), index) for index in range(count)]
+    heapq.heapify(due)
+    lateness, runs, busy = [], 0, 0.0
+    while due:
+        due_at, index = heapq.heappop(due)
+        time.sleep(max(0.0, due_at - time.time()))
+        session = sessions[index]
+        at = session["at"]
+        tracker = at.session_state["tracker"]
+        if session["checks"] >= args.cycles and not tracker.busy:
+            continue # Done; checked before running, as a poll that sees the last check finish may start another
+        now = time.time()
+        walked = args.walk_speed * (now - started)
+        lat = session["origin"][0] + walked * math.cos(session["heading"]) / METERS_PER_DEGREE_LAT
+        lon = session["origin"][1] + walked * math.sin(session["heading"]) / (METERS_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+        at.session_state["bench_location"] = {"latitude": lat, "longitude": lon, "accuracy": 5, "timestamp": now * 1000}
+        idle = tracker is None or not tracker.busy
+        scheduled = tracker.next_check_at if tracker is not None else None
+        if tracker is None:
+            at.button[0].click()
+        at.run()
+        ended = time.time()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        runs += 1
+        busy += ended - now
+        tracker = at.session_state["tracker"]
+        if idle and (tracker.busy or tracker.next_check_at != scheduled):
+            # This run started a check
+            lateness.append(now - due_at)
+            session["checks"] += 1
+        timer = args.poll_interval / 1000 if tracker.pending else tracker.refresh_interval
+        heapq.heappush(due, (ended + timer, index))
+    return lateness, runs, busy, time.time() - started
+
+
+# --- Session Memory ---
+SESSION_FIELDS = ("running", "last_location", "last_results", "status_message", "error_message", "summaries")
+# Per-session state of the SessionTracker; the engine its checks run on is process-wide
+TRACKER_FIELDS = ("next_check_at", "refresh_interval", "_location", "_last_query", "_last_results", "_summaries",
+                  "_history", "_prefetched_at")
+
+
+def _clone(value, memo=None):
+    """
+    Deep copy that also copies strings, so each clone owns its objects the way
+    separate sessions do. Objects reached twice (e.g. results held by both the
+    session state and its tracker) are copied once.
+    """
+    memo = {} if memo is None else memo
+    if id(value) in memo:
+        return memo[id(value)]
+    if isinstance(value, str):
+        copy = value.encode().decode()
+    elif isinstance(value, dict):
+        copy = {_clone(k, memo): _clone(v, memo) for k, v in value.items()}
+    elif isinstance(value, list):
+        copy = [_clone(v, memo) for v in value]
+    elif isinstance(value, tuple):
+        copy = tuple(_clone(v, memo) for v in value)
+    elif getattr(type(value), "__slots__", None) is not None:
+        copy = object.__new__(type(value))
+        for name in type(value).__slots__:
+            if hasattr(value, name):
+                setattr(copy, name, _clone(getattr(value, name), memo))
+    elif hasattr(value, "__dict__"):
+        copy = object.__new__(type(value))
+        copy.__dict__.update(_clone(value.__dict__, memo))
+    else:
+        return value
+    memo[id(value)] = copy
+    return copy
+
+
+def _clone_session(state, tracker):
+    """
+    A copy of one session's UI state, plus a SessionTracker on the same engine
+    carrying a copy of the tracker's per-session fields.
+    """
+    memo = {}
+    copy = _clone(state, memo)
+    copy["tracker"] = type(tracker)(tracker.engine)
+    for name in TRACKER_FIELDS:
+        setattr(copy["tracker"], name, _clone(getattr(tracker, name), memo))
+    return copy
+
+
+def _measure_memory(args):
+    """
+    Worker process entry point for --memory-sessions. Drives one session through
+    its cycles, then clones the per-session state (UI fields and tracker) N
+    times and returns (N, traced bytes) for each requested N. Process-wide
+    caches are shared across sessions and are not counted.
+    """
+    _install_probes()
+    at, _ = _run_session(0, args)
+    state = {field: at.session_state[field] for field in SESSION_FIELDS}
+    tracker = at.session_state["tracker"]
+    results = []
+    for count in args.memory_sessions:
+        tracemalloc.start()
+        sessions = [_clone_session(state, tracker) for _ in range(count)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del sessions
+        results.append((count, size))
+    return results
+
+
+def _report(name, values):
+    ms = np.asarray(values) * 1000
+    print(f"{name:<24} p50={np.percentile(ms, 50):8.1f}ms  p95={np.percentile(ms, 95):8.1f}ms  p99={np.percentile(ms, 99):8.1f}ms")
+
+
+def _drive(args, workers):
+    """
+    Runs args.sessions sessions spread over worker processes. Returns the samples,
+    the elapsed time and worker errors.
+    """
+    workers = min(workers, args.sessions)
+    assignments = [list(range(args.sessions))[w::workers] for w in range(workers)]
+    samples, spans, errors = [], [], []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for future in [pool.submit(_run_worker, indices, args) for indices in assignments]:
+            try:
+                worker_samples, start, end = future.result()
+                samples.extend(worker_samples)
+                spans.append((start, end))
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+    # Measured from the first worker starting to drive sessions, excluding process startup
+    elapsed = max(end for _, end in spans) - min(start for start, _ in spans) if spans else 0
+    return samples, elapsed, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="Simulated concurrent sessions")
+    parser.add_argument("--cycles", type=int, default=5, help="Tracking cycles per session")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes driving the sessions (default: one per session)")
+    parser.add_argument("--step-meters", type=float, default=120, help="Distance each session walks between cycles")
+    parser.add_argument("--step-seconds", type=float, default=0,
+                        help="Simulated time between location fixes (default: wall clock between cycles)")
+    parser.add_argument("--latitude", type=float, default=40.7484)
+    parser.add_argument("--longitude", type=float, default=-73.9857)
+    parser.add_argument("--start-spread", type=float, default=0.01,
+                        help="Sessions start up to this many degrees from --latitude/--longitude")
+    parser.add_argument("--page-spacing", type=float, default=80, help="Meters between synthetic pages")
+    parser.add_argument("--wiki-latency", type=float, default=80, help="ms")
+    parser.add_argument("--wiki-jitter", type=float, default=20, help="ms")
+    parser.add_argument("--wiki-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-latency", type=float, default=600, help="ms")
+    parser.add_argument("--openai-jitter", type=float, default=150, help="ms")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-token-interval", type=float, default=30, help="ms between streamed tokens")
+    parser.add_argument("--summary-source", choices=("extracts", "llm"), help="Overrides the app's SUMMARY_SOURCE")
+    parser.add_argument("--summary-strategy", choices=("batch", "concurrent", "stream", "serial"),
+                        help="Overrides the app's SUMMARY_STRATEGY")
+    parser.add_argument("--poll-interval", type=float, default=1000,
+                        help="ms between reruns while a cycle is in flight (the app's CHECK_POLL_SECONDS)")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-run AppTest timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--script-threads", type=int, default=64,
+                        help="Script threads the server can run at once, for the --capacity per-process estimate")
+    parser.add_argument("--capacity", type=int, nargs="+",
+                        help="Instead of timing, run each of these session counts on one script thread and report "
+                             "how many checks start late")
+    parser.add_argument("--walk-speed", type=float, default=1.4, help="m/s each --capacity session walks")
+    parser.add_argument("--late-seconds", type=float, default=5,
+                        help="A --capacity check starting this much after it was due missed its interval")
+    parser.add_argument("--memory-sessions", type=int, nargs="+",
+                        help="Instead of timing, report session-state memory at these session counts")
+    parser.add_argument("--cache-backend", choices=("none", "sqlite", "redis"), default="none",
+                        help="Shared cache tier for the app (redis uses a local stand-in server)")
+    parser.add_argument("--replicas", type=int, nargs="+",
+                        help="Instead of timing, run the sessions over each of these replica counts and report "
+                             "upstream requests and shared-cache hit rate")
+    args = parser.parse_args(argv)
+
+    wiki = UpstreamProfile(args.wiki_latency, args.wiki_jitter, args.wiki_error_rate, args.seed)
+    llm = UpstreamProfile(args.openai_latency, args.openai_jitter, args.openai_error_rate, args.seed + 1,
+                          args.openai_token_interval)
+    wiki_server = _serve(make_wiki_handler(wiki, args.page_spacing))
+    openai_server = _serve(make_openai_handler(llm))
+    os.environ["WIKIPEDIA_API_URL"] = f"http://127.0.0.1:{wiki_server.server_port}/w/api.php"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{openai_server.server_port}/v1"
+    if args.summary_source:
+        os.environ["SUMMARY_SOURCE"] = args.summary_source
+    if args.summary_strategy:
+        os.environ["SUMMARY_STRATEGY"] = args.summary_strategy
+    os.environ["SUMMARY_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="st-geo-gpt-bench-"), "summaries.sqlite3")
+    fake_redis = FakeRedis() if args.cache_backend == "redis" else None
+    if fake_redis:
+        os.environ["CACHE_BACKEND_URL"] = f"redis://127.0.0.1:{fake_redis.server_address[1]}/0"
+    elif args.cache_backend == "sqlite":
+        os.environ["CACHE_BACKEND_URL"] = "sqlite:///" + os.path.join(os.path.dirname(os.environ["SUMMARY_CACHE_PATH"]), "shared.sqlite3")
+    if args.replicas:
+        print(f"{args.sessions} sessions x {args.cycles} cycles, shared cache tier: {args.cache_backend}")
+        print("replicas  MediaWiki/cycle  OpenAI/cycle  shared hit rate")
+        for replicas in args.replicas:
+            # Cold caches for every replica count
+            run_dir = tempfile.mkdtemp(prefix="st-geo-gpt-bench-")
+            os.environ["SUMMARY_CACHE_PATH"] = os.path.join(run_dir, "summaries.sqlite3")
+            if args.cache_backend == "sqlite":
+                os.environ["CACHE_BACKEND_URL"] = "sqlite:///" + os.path.join(run_dir, "shared.sqlite3")
+            if fake_redis:
+                fake_redis.reset()
+            wiki_before, llm_before = wiki.requests, llm.requests
+            samples, _, errors = _drive(args, replicas)
+            for error in errors:
+                print(f"worker failed: {error}", file=sys.stderr)
+            cycles = max(1, len(samples))
+            lookups = fake_redis.hits + fake_redis.misses if fake_redis else 0
+            hit_rate = f"{fake_redis.hits / lookups:.0%}" if lookups else "n/a"
+            print(f"{replicas:>8}  {(wiki.requests - wiki_before) / cycles:>15.2f}  "
+                  f"{(llm.requests - llm_before) / cycles:>12.2f}  {hit_rate:>15}")
+        return 0
+    if args.capacity:
+        print(f"{args.cycles} checks per session on one script thread, walking at {args.walk_speed} m/s")
+        print("sessions  checks  late p50  late p95  missed  runs/check  thread busy")
+        capacity = 0
+        for count in args.capacity:
+            run_dir = tempfile.mkdtemp(prefix="st-geo-gpt-bench-")
+            os.environ["SUMMARY_CACHE_PATH"] = os.path.join(run_dir, "summaries.sqlite3")
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                lateness, runs, busy, elapsed = pool.submit(_run_capacity, count, args).result()
+            missed = sum(late > args.late_seconds for late in lateness) / len(lateness)
+            if missed <= 0.01:
+                capacity = max(capacity, count)
+            print(f"{count:>8}  {len(lateness):>6}  {np.percentile(lateness, 50):>7.1f}s  "
+                  f"{np.percentile(lateness, 95):>7.1f}s  {missed:>6.0%}  {runs / len(lateness):>10.1f}  "
+                  f"{busy / elapsed:>11.0%}")
+        print(f"largest session count with at most 1% of checks over {args.late_seconds:g}s late: {capacity or 'none'} "
+              f"per script thread, ~{capacity * args.script_threads:,} at {args.script_threads} script threads")
+        return 0
+    if args.memory_sessions:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for count, size in pool.submit(_measure_memory, args).result():
+                print(f"{count:>6} sessions: {size / 2**20:8.1f} MiB session state ({size / count:,.0f} bytes/session)")
+        return 0
+    samples, elapsed, errors = _drive(args, args.workers or args.sessions)
+
+    for error in errors:
+        print(f"worker failed: {error}", file=sys.stderr)
+    if not samples:
+        return 1
+    print(f"{args.sessions} sessions x {args.cycles} cycles in {elapsed:.1f}s "
+          f"({len(samples) / elapsed:.2f} cycles/s)")
+    _report("time-to-first-result", [s[0] for s in samples])
+    _report("time-to-all-summaries", [s[1] for s in samples])
+    print(f"script executions per cycle: {np.mean([s[2] for s in samples]):.2f} (max {max(s[2] for s in samples)})")
+    print(f"MediaWiki requests: {wiki.requests} ({wiki.errors} failed), "
+          f"OpenAI requests: {llm.requests} ({llm.errors} failed)")
+    # A session holds a script thread only while its runs execute; --capacity measures how many fit on one
+    print(f"script thread held per cycle: {np.mean([s[3] for s in samples]) * 1000:.1f}ms "
+          f"every {np.mean([s[4] for s in samples]):.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
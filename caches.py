@@ -0,0 +1,387 @@
+"""
+Process-wide caches behind app.py's tracking cycle.
+
+Plain Python with no Streamlit calls, so the classes can be tested on their
+own; app.py creates one of each per process with st.cache_resource.
+"""
+import sqlite3
+import threading
+import time
+
+try:
+    import redis # Optional: only needed for a redis:// CACHE_BACKEND_URL
+except ImportError:
+    redis = None
+
+SHARED_CACHE_PREFIX = "st-geo-gpt:" # Namespace for keys in the shared tier
+SHARED_CACHE_SCHEMA = 1 # Bump when a shared value layout (e.g. PageRecord fields) changes
+
+
+# --- SQLite Helpers ---
+def connect_sqlite(path):
+    """Connection usable from any thread, in WAL mode so several processes can share the file."""
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    for attempt in range(50):
+        # Switching to WAL doesn't wait on the busy timeout, so processes opening a new file together retry
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            break
+        except sqlite3.OperationalError:
+            if attempt == 49:
+                raise
+            time.sleep(0.1)
+    return conn
+
+
+def shared_key(*parts):
+    return f"{SHARED_CACHE_PREFIX}v{SHARED_CACHE_SCHEMA}:" + ":".join(str(part) for part in parts)
+
+
+# --- Shared Cache Tier ---
+class SQLiteSharedCache:
+    """
+    Shared cache tier in a SQLite file, for replicas on one host or with a
+    shared disk. Values are strings with a TTL; expired entries are purged as
+    new ones are written. Errors count as misses.
+    """
+    def __init__(self, path):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS shared_cache_expiry ON shared_cache (expires_at)")
+
+    def get_many(self, keys):
+        """Returns {key: value} for the keys present and unexpired."""
+        if not keys:
+            return {}
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM shared_cache WHERE expires_at > ? AND key IN ({','.join('?' * len(keys))})",
+                    (time.time(), *keys),
+                ).fetchall()
+        except sqlite3.Error:
+            self.errors += 1
+            rows = []
+        found = dict(rows)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items, ttl_seconds):
+        now = time.time()
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (now,))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO shared_cache VALUES (?, ?, ?)",
+                    [(key, value, now + ttl_seconds) for key, value in items.items()],
+                )
+        except sqlite3.Error:
+            self.errors += 1
+
+
+class RedisSharedCache:
+    """
+    Shared cache tier on a Redis-protocol server (Redis, Valkey, KeyDB, ...),
+    for replicas on separate hosts. Needs the optional redis package. Errors
+    and timeouts count as misses, so a down server only costs cache hits.
+    """
+    def __init__(self, url, timeout_seconds=0.5):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND_URL is a Redis URL but the redis package is not installed.")
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._client = redis.Redis.from_url(
+            url,
+            socket_timeout=timeout_seconds,
+            socket_connect_timeout=timeout_seconds,
+            decode_responses=True,
+        )
+
+    def get_many(self, keys):
+        """Returns {key: value} for the keys present and unexpired."""
+        if not keys:
+            return {}
+        try:
+            values = self._client.mget(keys)
+        except (redis.RedisError, OSError):
+            self.errors += 1
+            values = [None] * len(keys)
+        found = {key: value for key, value in zip(keys, values) if value is not None}
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items, ttl_seconds):
+        try:
+            pipeline = self._client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipeline.set(key, value, ex=max(1, int(ttl_seconds)))
+            pipeline.execute()
+        except (redis.RedisError, OSError):
+            self.errors += 1
+
+
+# --- Geosearch Tile Cache ---
+class TileCache:
+    """
+    Process-wide cache of geosearch results per grid tile, shared by all sessions.
+    Each entry holds every page within covered_radius of the tile center; queries
+    whose search circle fits inside that radius are answered locally.
+    """
+    def __init__(self, ttl_seconds, max_tiles):
+        self.ttl_seconds = ttl_seconds
+        self.max_tiles = max_tiles
+        self.hits = 0
+        self.misses = 0
+        self._tiles = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry and time.time() - entry[0] < self.ttl_seconds:
+                self._tiles[key] = self._tiles.pop(key) # Move to the most recently used end
+                self.hits += 1
+                return entry[1:]
+            self.misses += 1
+            return None
+
+    def put(self, key, center, covered_radius, pages, fetched_at=None):
+        with self._lock:
+            self._tiles.pop(key, None)
+            self._tiles[key] = (fetched_at or time.time(), center, covered_radius, pages)
+            while len(self._tiles) > self.max_tiles:
+                del self._tiles[next(iter(self._tiles))]
+
+
+# --- Revision Tracking ---
+class RevisionCache:
+    """
+    Latest known lastrevid per page id and when it was last confirmed, so
+    results served from the tile cache can be revalidated in bulk.
+    """
+    def __init__(self, max_pages=100000):
+        self.max_pages = max_pages
+        self._revisions = {}
+        self._lock = threading.Lock()
+
+    def get(self, page_id, max_age_seconds):
+        """Returns the revision if it was confirmed within max_age_seconds, else None."""
+        with self._lock:
+            entry = self._revisions.get(page_id)
+        if entry and time.time() - entry[1] <= max_age_seconds:
+            return entry[0]
+        return None
+
+    def update(self, revisions, confirmed_at=None):
+        """Records {page_id: revision} as confirmed at confirmed_at (default now), unless confirmed more recently."""
+        now = confirmed_at or time.time()
+        with self._lock:
+            for page_id, revision in revisions.items():
+                entry = self._revisions.pop(page_id, None)
+                self._revisions[page_id] = entry if entry and entry[1] > now else (revision, now)
+            while len(self._revisions) > self.max_pages:
+                del self._revisions[next(iter(self._revisions))]
+
+
+# --- Persistent Summary Store ---
+class SummaryStore:
+    """
+    SQLite-backed summary cache that survives restarts and is shared by every
+    worker process pointing at the same file. Entries are keyed by
+    (page_id, revision, model) and never expire: an edit changes the revision,
+    which replaces the entry. Evicted least-recently-used past max_entries.
+    Lookups only read: access times and hit/miss counters are kept in memory
+    and written back at most every flush_seconds, or with the next put.
+    With a shared tier, misses are looked up there and puts are written to it
+    (with shared_ttl_seconds), so replicas on other hosts reuse each other's
+    summaries. SQLite errors count as misses, like the shared tier's.
+    """
+    def __init__(self, path, max_entries, shared=None, shared_ttl_seconds=7 * 24 * 3600, flush_seconds=30):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.shared_ttl_seconds = shared_ttl_seconds
+        self.flush_seconds = flush_seconds
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._accessed = {} # {(page_id, revision, model): last_access} not yet written back
+        self._counts = [0, 0] # Hits and misses not yet written back
+        self._flushed_at = time.monotonic()
+        self._conn = connect_sqlite(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " page_id INTEGER NOT NULL, revision INTEGER NOT NULL, model TEXT NOT NULL,"
+                " summary TEXT NOT NULL, last_access REAL NOT NULL,"
+                " PRIMARY KEY (page_id, revision, model))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_lru ON summaries (last_access)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+
+    def get(self, page_id, revision, model):
+        """Returns the cached summary, or None on a miss."""
+        return self.get_many([(page_id, revision)], model).get(page_id)
+
+    def get_many(self, keys, model):
+        """Returns {page_id: summary} for the (page_id, revision) keys that are cached here or in the shared tier."""
+        if not keys:
+            return {}
+        revisions = dict(keys)
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT page_id, revision, summary FROM summaries"
+                    f" WHERE model = ? AND page_id IN ({','.join('?' * len(revisions))})",
+                    (model, *revisions),
+                ).fetchall()
+        except sqlite3.Error:
+            self.errors += 1
+            rows = []
+        found = {page_id: summary for page_id, revision, summary in rows if revisions[page_id] == revision}
+        missing = [(page_id, revision) for page_id, revision in keys if page_id not in found]
+        if missing and self.shared is not None:
+            shared_keys = {shared_key("summary", page_id, revision, model): (page_id, revision) for page_id, revision in missing}
+            for key, summary in self.shared.get_many(list(shared_keys)).items():
+                page_id, revision = shared_keys[key]
+                self._put_local(page_id, revision, model, summary)
+                found[page_id] = summary
+        now = time.time()
+        with self._lock:
+            for page_id in found:
+                self._accessed[(page_id, revisions[page_id], model)] = now
+            self._counts[0] += len(found)
+            self._counts[1] += len(keys) - len(found)
+            due = time.monotonic() - self._flushed_at >= self.flush_seconds
+        if due:
+            self.flush()
+        return found
+
+    def put(self, page_id, revision, model, summary):
+        self._put_local(page_id, revision, model, summary)
+        if self.shared is not None:
+            self.shared.set_many({shared_key("summary", page_id, revision, model): summary}, self.shared_ttl_seconds)
+
+    def flush(self):
+        """Writes back the access times and counters gathered since the last flush."""
+        try:
+            with self._lock, self._conn:
+                self._flush_locked()
+        except sqlite3.Error:
+            self.errors += 1
+
+    def _flush_locked(self):
+        # Called in a transaction holding self._lock; pending updates are dropped if it fails
+        accessed, self._accessed = self._accessed, {}
+        (hits, misses), self._counts = self._counts, [0, 0]
+        self._flushed_at = time.monotonic()
+        self._conn.executemany(
+            "UPDATE summaries SET last_access = MAX(last_access, ?) WHERE page_id = ? AND revision = ? AND model = ?",
+            [(last_access, *key) for key, last_access in accessed.items()],
+        )
+        self._conn.executemany(
+            "UPDATE counters SET value = value + ? WHERE name = ?", [(hits, "hits"), (misses, "misses")]
+        )
+
+    def _put_local(self, page_id, revision, model, summary):
+        try:
+            with self._lock, self._conn:
+                # Eviction below goes by access time, so write back the pending ones first
+                self._flush_locked()
+                # Summaries of older revisions can never be served again
+                self._conn.execute(
+                    "DELETE FROM summaries WHERE page_id = ? AND model = ? AND revision < ?",
+                    (page_id, model, revision),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+                    (page_id, revision, model, summary, time.time()),
+                )
+                overflow = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM summaries WHERE rowid IN"
+                        " (SELECT rowid FROM summaries ORDER BY last_access LIMIT ?)",
+                        (overflow,),
+                    )
+        except sqlite3.Error:
+            self.errors += 1
+
+    def stats(self):
+        """Returns hit/miss counters (across all processes), the current entry count and this process's errors."""
+        self.flush()
+        try:
+            with self._lock:
+                stats = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+                stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        except sqlite3.Error:
+            self.errors += 1
+            stats = {"hits": 0, "misses": 0, "entries": 0}
+        stats["errors"] = self.errors
+        return stats
+
+
+# --- Shared Page Cache ---
+class PageCache:
+    """
+    Process-wide cache keyed by page id that every session reads from: each
+    page's latest seen revision and its summaries at that revision, per summary
+    model. A page that reappears, for this session or any other, is summarized
+    from here without the summary store or the network; a new revision drops
+    the old summaries. Evicted least-recently-used past max_pages. The SQLite
+    summary store behind it is the tier shared with other processes.
+    """
+    def __init__(self, max_pages):
+        self.max_pages = max_pages
+        self.hits = 0
+        self.misses = 0
+        self._pages = {} # {page_id: (revision, {model: summary})}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the summary for a (page_id, revision, model) key, or None if it isn't held."""
+        page_id, revision, model = key
+        with self._lock:
+            entry = self._pages.pop(page_id, None)
+            if entry is None:
+                return None
+            self._pages[page_id] = entry # Move to the most recently used end
+        return entry[1].get(model) if entry[0] == revision else None
+
+    def get_many(self, pages, model):
+        """Returns {page_id: summary} for the pages held at their current revision."""
+        found = {}
+        for page in pages:
+            summary = self.get(page.summary_key(model))
+            if summary is not None:
+                found[page.pageid] = summary
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(pages) - len(found)
+        return found
+
+    def update(self, summaries):
+        """Adds {(page_id, revision, model): summary} entries, skipping None summaries."""
+        with self._lock:
+            for (page_id, revision, model), summary in summaries.items():
+                if summary is None:
+                    continue
+                entry = self._pages.pop(page_id, None)
+                if entry is None or entry[0] != revision:
+                    entry = (revision, {})
+                entry[1][model] = summary
+                self._pages[page_id] = entry
+            while len(self._pages) > self.max_pages:
+                del self._pages[next(iter(self._pages))]
@@ -0,0 +1,347 @@
+"""
+Offline geosearch index built from the Wikipedia `geo_tags` and `page` SQL dumps.
+
+The index is a single memory-mapped columnar file: points are sorted by grid cell
+so a radius query only touches the few contiguous cell ranges around the center.
+
+Usage:
+    python geo_index.py build enwiki-latest-geo_tags.sql.gz enwiki-latest-page.sql.gz -o geo_index.bin
+    python geo_index.py synth geo_index.bin --points 2000000
+    python geo_index.py query geo_index.bin 40.7484 -73.9857 --radius 250
+    python geo_index.py bench geo_index.bin --queries 1000
+"""
+import argparse
+import gzip
+import json
+import math
+import re
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+# --- File Format ---
+MAGIC = b"GEOIDX1\0"
+HEADER = struct.Struct("<8sQdQ") # magic, point count, cell size in degrees, title blob length
+DEFAULT_CELL_DEGREES = 0.01 # ~1.1km of latitude per cell
+
+
+# --- Geo Helpers ---
+# Shared with app.py and bench.py, so distances agree everywhere
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two lat/lon points in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def _grid_shape(cell_degrees):
+    return math.ceil(180 / cell_degrees), math.ceil(360 / cell_degrees)
+
+
+def _cell_keys(lats, lons, cell_degrees):
+    n_rows, n_cols = _grid_shape(cell_degrees)
+    rows = np.clip(np.floor((np.asarray(lats, dtype=np.float64) + 90) / cell_degrees), 0, n_rows - 1)
+    cols = np.floor((np.asarray(lons, dtype=np.float64) + 180) / cell_degrees) % n_cols
+    return rows.astype(np.int64) * n_cols + cols.astype(np.int64)
+
+
+def _layout(count, titles_len):
+    """Byte offsets of each column; every column starts 8-byte aligned."""
+    offsets = {}
+    pos = HEADER.size
+    for name, dtype, length in (
+        ("cells", np.int64, count),
+        ("lat", np.float32, count),
+        ("lon", np.float32, count),
+        ("page_id", np.uint32, count),
+        ("revision", np.uint32, count),
+        ("title_offsets", np.uint64, count + 1),
+        ("titles", np.uint8, titles_len),
+    ):
+        offsets[name] = (pos, dtype, length)
+        pos += -(-(np.dtype(dtype).itemsize * length) // 8) * 8
+    return offsets
+
+
+def write_index(path, page_ids, revisions, lats, lons, titles, cell_degrees=DEFAULT_CELL_DEGREES):
+    """Sorts the points by grid cell and writes them as a columnar index file."""
+    lats = np.asarray(lats, dtype=np.float32)
+    lons = np.asarray(lons, dtype=np.float32)
+    cells = _cell_keys(lats, lons, cell_degrees)
+    order = np.argsort(cells, kind="stable")
+
+    encoded = [titles[i].encode("utf-8") for i in order]
+    title_offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(t) for t in encoded], out=title_offsets[1:])
+    blob = b"".join(encoded)
+
+    columns = {
+        "cells": cells[order],
+        "lat": lats[order],
+        "lon": lons[order],
+        "page_id": np.asarray(page_ids, dtype=np.uint32)[order],
+        "revision": np.asarray(revisions, dtype=np.uint32)[order],
+        "title_offsets": title_offsets,
+        "titles": np.frombuffer(blob, dtype=np.uint8),
+    }
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(order), cell_degrees, len(blob)))
+        for name, (offset, dtype, _) in _layout(len(order), len(blob)).items():
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(columns[name].astype(dtype, copy=False).tobytes())
+
+
+# --- Reader ---
+class GeoIndex:
+    """
+    Read-only, memory-mapped view of an index file. Safe to share between threads.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, self.count, self.cell_degrees, titles_len = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a geo index file")
+        self.n_rows, self.n_cols = _grid_shape(self.cell_degrees)
+        for name, (offset, dtype, length) in _layout(self.count, titles_len).items():
+            column = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(length,)) if length else np.empty(0, dtype)
+            setattr(self, name, column)
+
+    def title(self, i):
+        start, end = int(self.title_offsets[i]), int(self.title_offsets[i + 1])
+        return bytes(self.titles[start:end]).decode("utf-8")
+
+    def _candidate_ranges(self, latitude, longitude, radius_meters):
+        """Yields [start, end) slices of the sorted arrays that may hold points in range."""
+        dlat = radius_meters / METERS_PER_DEGREE_LAT
+        row_lo = max(0, math.floor((latitude - dlat + 90) / self.cell_degrees))
+        row_hi = min(self.n_rows - 1, math.floor((latitude + dlat + 90) / self.cell_degrees))
+        max_abs_lat = min(90.0, abs(latitude) + dlat)
+        cos_lat = math.cos(math.radians(max_abs_lat))
+        dlon = 360.0 if cos_lat < 1e-9 else dlat / cos_lat
+        col_lo = math.floor((longitude - dlon + 180) / self.cell_degrees)
+        col_hi = math.floor((longitude + dlon + 180) / self.cell_degrees)
+        if col_hi - col_lo + 1 >= self.n_cols:
+            col_spans = [(0, self.n_cols - 1)]
+        else:
+            col_lo %= self.n_cols
+            col_hi %= self.n_cols
+            col_spans = [(col_lo, col_hi)] if col_lo <= col_hi else [(col_lo, self.n_cols - 1), (0, col_hi)]
+        for row in range(row_lo, row_hi + 1):
+            for lo, hi in col_spans:
+                start, end = np.searchsorted(self.cells, [row * self.n_cols + lo, row * self.n_cols + hi + 1])
+                if start < end:
+                    yield start, end
+
+    def query(self, latitude, longitude, radius_meters, limit=10):
+        """
+        Returns up to `limit` pages within radius_meters, nearest first, shaped like
+        MediaWiki `list=geosearch` results.
+        """
+        ranges = list(self._candidate_ranges(latitude, longitude, radius_meters))
+        if not ranges:
+            return []
+        idx = np.concatenate([np.arange(start, end) for start, end in ranges])
+        lat = np.radians(self.lat[idx].astype(np.float64))
+        lon = np.radians(self.lon[idx].astype(np.float64))
+        phi = math.radians(latitude)
+        a = np.sin((lat - phi) / 2) ** 2 + math.cos(phi) * np.cos(lat) * np.sin((lon - math.radians(longitude)) / 2) ** 2
+        dist = 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        inside = np.flatnonzero(dist <= radius_meters)
+        nearest = inside[np.argsort(dist[inside], kind="stable")[:limit]]
+        return [
+            {
+                "pageid": int(self.page_id[idx[i]]),
+                "ns": 0,
+                "title": self.title(idx[i]),
+                "lat": float(self.lat[idx[i]]),
+                "lon": float(self.lon[idx[i]]),
+                "dist": round(float(dist[i]), 1),
+                "primary": True,
+                "lastrevid": int(self.revision[idx[i]]),
+            }
+            for i in nearest
+        ]
+
+
+# --- SQL Dump Parsing ---
+_TOKEN_RE = re.compile(r"'((?:[^'\\]|\\.)*)'|(\()|(\))|([^,()'\s;]+)")
+_ESCAPES = {"0": "\0", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+_ESCAPE_RE = re.compile(r"\\(.)")
+
+
+def _unescape(value):
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), value)
+
+
+def iter_dump_rows(path, table):
+    """Yields each row of `INSERT INTO table VALUES ...` statements as a list of strings/None."""
+    prefix = f"INSERT INTO `{table}` VALUES "
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.startswith(prefix):
+                continue
+            row = None
+            for m in _TOKEN_RE.finditer(line, len(prefix)):
+                quoted, open_paren, close_paren, bare = m.groups()
+                if open_paren:
+                    row = []
+                elif close_paren:
+                    if row is not None:
+                        yield row
+                    row = None
+                elif row is not None:
+                    row.append(_unescape(quoted) if quoted is not None else (None if bare == "NULL" else bare))
+
+
+def build_from_dumps(geo_tags_path, page_path, output_path, cell_degrees=DEFAULT_CELL_DEGREES):
+    """Joins primary Earth coordinates from geo_tags with main-namespace titles from page."""
+    coords = {}
+    for row in iter_dump_rows(geo_tags_path, "geo_tags"):
+        # gt_id, gt_page_id, gt_globe, gt_primary, gt_lat, gt_lon, ...
+        if row[2] == "earth" and row[3] == "1" and row[4] is not None and row[5] is not None:
+            coords[int(row[1])] = (float(row[4]), float(row[5]))
+    print(f"Read {len(coords)} primary coordinates", file=sys.stderr)
+
+    page_ids, revisions, lats, lons, titles = [], [], [], [], []
+    for row in iter_dump_rows(page_path, "page"):
+        # page_id, page_namespace, page_title, page_is_redirect, page_is_new, page_random,
+        # page_touched, page_links_updated, page_latest, ...
+        page_id = int(row[0])
+        if row[1] != "0" or row[3] == "1" or page_id not in coords:
+            continue
+        lat, lon = coords[page_id]
+        page_ids.append(page_id)
+        revisions.append(int(row[8]))
+        lats.append(lat)
+        lons.append(lon)
+        titles.append(row[2].replace("_", " "))
+    write_index(output_path, page_ids, revisions, lats, lons, titles, cell_degrees)
+    print(f"Wrote {len(page_ids)} pages to {output_path}", file=sys.stderr)
+
+
+# --- Local Stand-in Server ---
+def make_geosearch_handler(index):
+    """Request handler answering `action=query&list=geosearch` from an index."""
+    class GeosearchHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep-alive, like the real API
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            lat, lon = (float(x) for x in params["gscoord"].split("|"))
+            pages = index.query(lat, lon, float(params["gsradius"]), int(params.get("gslimit", 10)))
+            body = json.dumps({"batchcomplete": True, "query": {"geosearch": pages}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return GeosearchHandler
+
+
+# --- CLI ---
+def _percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return f"p50={np.percentile(samples, 50):.3f}ms p95={np.percentile(samples, 95):.3f}ms p99={np.percentile(samples, 99):.3f}ms"
+
+
+def _bench(args):
+    import requests
+
+    index = GeoIndex(args.index)
+    rng = np.random.default_rng(0)
+    picks = rng.integers(0, index.count, args.queries)
+    jitter = rng.normal(0, args.radius / METERS_PER_DEGREE_LAT, (args.queries, 2))
+    centers = [(float(index.lat[i]) + dy, float(index.lon[i]) + dx) for i, (dy, dx) in zip(picks, jitter)]
+
+    offline = []
+    for lat, lon in centers:
+        start = time.perf_counter()
+        index.query(lat, lon, args.radius, args.limit)
+        offline.append(time.perf_counter() - start)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_geosearch_handler(index))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/w/api.php"
+    http = []
+    with requests.Session() as session:
+        for lat, lon in centers:
+            params = {"action": "query", "list": "geosearch", "gscoord": f"{lat}|{lon}",
+                      "gsradius": args.radius, "gslimit": args.limit, "format": "json", "formatversion": 2}
+            start = time.perf_counter()
+            session.get(url, params=params, timeout=10).json()
+            http.append(time.perf_counter() - start)
+    server.shutdown()
+
+    print(f"{index.count} points, {args.queries} queries, radius {args.radius}m")
+    print(f"offline index:        {_percentiles(offline)}")
+    print(f"HTTP (local stand-in): {_percentiles(http)}")
+
+
+def _synth(args):
+    """Writes an index of uniformly scattered points over a bounding box, for benchmarking."""
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(args.bbox[0], args.bbox[2], args.points)
+    lons = rng.uniform(args.bbox[1], args.bbox[3], args.points)
+    ids = np.arange(1, args.points + 1)
+    write_index(args.output, ids, ids, lats, lons, [f"Page {i}" for i in ids])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Build an index from geo_tags and page SQL dumps")
+    build.add_argument("geo_tags")
+    build.add_argument("page")
+    build.add_argument("-o", "--output", default="geo_index.bin")
+    build.add_argument("--cell-degrees", type=float, default=DEFAULT_CELL_DEGREES)
+
+    synth = sub.add_parser("synth", help="Build a synthetic index for benchmarking")
+    synth.add_argument("output")
+    synth.add_argument("--points", type=int, default=1_000_000)
+    synth.add_argument("--bbox", type=float, nargs=4, default=[40.5, -74.3, 40.95, -73.7],
+                       metavar=("MIN_LAT", "MIN_LON", "MAX_LAT", "MAX_LON"))
+
+    query = sub.add_parser("query", help="Run one radius query")
+    query.add_argument("index")
+    query.add_argument("latitude", type=float)
+    query.add_argument("longitude", type=float)
+    query.add_argument("--radius", type=float, default=250)
+    query.add_argument("--limit", type=int, default=5)
+
+    bench = sub.add_parser("bench", help="Compare index queries with HTTP geosearch against a local stand-in server")
+    bench.add_argument("index")
+    bench.add_argument("--queries", type=int, default=1000)
+    bench.add_argument("--radius", type=float, default=250)
+    bench.add_argument("--limit", type=int, default=5)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build_from_dumps(args.geo_tags, args.page, args.output, args.cell_degrees)
+    elif args.command == "synth":
+        _synth(args)
+    elif args.command == "query":
+        print(json.dumps(GeoIndex(args.index).query(args.latitude, args.longitude, args.radius, args.limit), indent=2))
+    else:
+        _bench(args)
+
+
+if __name__ == "__main__":
+    main()
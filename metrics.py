@@ -0,0 +1,126 @@
+"""
+Prometheus metrics for app.py, exported when prometheus_client is installed.
+
+Streamlit re-executes app.py on every rerun and rebuilds cache_resource
+singletons when they're cleared, so the metrics live here: this module is
+imported once per process and registers them once, on its own registry. Each
+metric is None when prometheus_client isn't available. The process-wide
+statistics app.py shows on the page and mirrors to these metrics live here too.
+"""
+import contextlib
+import threading
+import time
+
+try:
+    import prometheus_client # Optional: metrics are only exported when installed
+except ImportError:
+    prometheus_client = None
+
+if prometheus_client is not None:
+    REGISTRY = prometheus_client.CollectorRegistry()
+    STAGE_SECONDS = prometheus_client.Histogram(
+        "st_geo_gpt_stage_seconds", "Duration of each tracking-cycle stage", ["stage"], registry=REGISTRY
+    )
+    RESULT_PAGES = prometheus_client.Counter(
+        "st_geo_gpt_result_pages", "Pages per search by change from the session's previous results", ["change"],
+        registry=REGISTRY,
+    )
+    OPENAI_QUEUE_DEPTH = prometheus_client.Gauge(
+        "st_geo_gpt_openai_queue_depth", "OpenAI requests waiting for rate-limit budget", registry=REGISTRY
+    )
+    OPENAI_SHED = prometheus_client.Counter(
+        "st_geo_gpt_openai_shed", "OpenAI requests shed by the rate limiter", registry=REGISTRY
+    )
+else:
+    REGISTRY = STAGE_SECONDS = RESULT_PAGES = OPENAI_QUEUE_DEPTH = OPENAI_SHED = None
+
+_serving = None
+_serve_lock = threading.Lock()
+
+
+def serve(port):
+    """
+    Serves /metrics on this port, once per process; later calls return the
+    port already being served. Returns None if prometheus_client isn't installed.
+    """
+    global _serving
+    if prometheus_client is None:
+        return None
+    with _serve_lock:
+        if _serving is None:
+            prometheus_client.start_http_server(port, registry=REGISTRY)
+            _serving = port
+        return _serving
+
+
+class StageTimings:
+    """
+    Process-wide latency samples per tracking-cycle stage, kept as a rolling
+    window for the debug sidebar and mirrored to Prometheus when available.
+    """
+    def __init__(self, window):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.setdefault(stage, [])
+            samples.append(seconds)
+            del samples[:-self.window]
+        if STAGE_SECONDS is not None:
+            STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def summary(self):
+        """Rows of count / p50 / p95 / last (ms) per stage."""
+        with self._lock:
+            snapshot = {stage: list(samples) for stage, samples in self._samples.items()}
+        rows = []
+        for stage, samples in snapshot.items():
+            ordered = sorted(samples)
+            rows.append({
+                "stage": stage,
+                "count": len(ordered),
+                "p50 (ms)": round(ordered[len(ordered) // 2] * 1000, 1),
+                "p95 (ms)": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                "last (ms)": round(samples[-1] * 1000, 1),
+            })
+        return rows
+
+
+class ChurnStats:
+    """
+    Process-wide counts of pages kept, added and dropped between each session's
+    consecutive searches, mirrored to Prometheus when available. Kept pages
+    carry their summaries over; only added ones are summarized.
+    """
+    def __init__(self):
+        self.searches = 0
+        self.kept = 0
+        self.added = 0
+        self.removed = 0
+        self._lock = threading.Lock()
+
+    def observe(self, kept, added, removed):
+        with self._lock:
+            self.searches += 1
+            self.kept += kept
+            self.added += added
+            self.removed += removed
+        if RESULT_PAGES is not None:
+            for change, count in (("kept", kept), ("added", added), ("removed", removed)):
+                RESULT_PAGES.labels(change=change).inc(count)
+
+    def churn(self):
+        """Fraction of pages that changed across all observed searches (0 = none)."""
+        with self._lock:
+            total = self.kept + self.added + self.removed
+            return (self.added + self.removed) / total if total else 0.0
@@ -0,0 +1,154 @@
+"""
+Token-bucket rate limiting for OpenAI requests, shared by every session in
+the process. Runs on the tracking loop in app.py; see OpenAIRateLimiter.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+
+import metrics
+
+
+class OpenAIRequestShed(Exception):
+    """The rate limiter dropped a request instead of queueing it."""
+
+
+def estimate_tokens(messages, max_tokens):
+    """Rough size of a chat request for the token budget: ~4 characters per prompt token plus the completion allowance."""
+    return sum(len(message["content"]) for message in messages) // 4 + max_tokens
+
+
+class OpenAIRateLimiter:
+    """
+    Process-wide token buckets for OpenAI requests and tokens per minute.
+    Requests over budget wait in a queue served by priority (lower first: the
+    distance of the page being summarized, so the closest pages go first).
+    When the queue is full or a request would wait past max_wait_seconds, the
+    farthest request is shed with OpenAIRequestShed instead of running into
+    429s and timeouts. State is only touched on the tracking loop; other
+    threads use acquire_blocking. Queue waits are reported to timings (a
+    metrics.StageTimings) when given.
+    """
+    def __init__(self, loop, requests_per_minute, tokens_per_minute, max_queue, max_wait_seconds, timings=None):
+        self.loop = loop
+        self.timings = timings
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.granted = 0
+        self.shed = 0
+        self.depth = 0
+        self.max_depth = 0
+        self._capacity = (requests_per_minute, tokens_per_minute)
+        self._levels = [requests_per_minute, tokens_per_minute]
+        self._refilled_at = time.monotonic()
+        self._waiters = [] # Heap of (priority, sequence, tokens, future)
+        self._sequence = itertools.count()
+        self._timer = None
+        self._depth_gauge = metrics.OPENAI_QUEUE_DEPTH
+        self._shed_counter = metrics.OPENAI_SHED
+
+    async def acquire(self, tokens, priority):
+        """Waits for budget for one request of about this many tokens. Raises OpenAIRequestShed."""
+        tokens = min(tokens, self._capacity[1])
+        started = time.perf_counter()
+        self._refill()
+        if not self._waiters and self._fits(tokens):
+            self._take(tokens)
+        else:
+            if self.depth >= self.max_queue or self._expected_wait(tokens) > self.max_wait_seconds:
+                self._make_room(priority)
+            future = self.loop.create_future()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), tokens, future))
+            self._set_depth(self.depth + 1)
+            self._schedule()
+            try:
+                await asyncio.wait_for(future, self.max_wait_seconds)
+            except asyncio.TimeoutError:
+                self._count_shed()
+                raise OpenAIRequestShed("Waited too long for OpenAI rate limit budget") from None
+            finally:
+                if future.cancelled():
+                    # Left the queue without being granted; the entry is skipped when it reaches the head
+                    self._set_depth(self.depth - 1)
+        if self.timings is not None:
+            self.timings.observe("openai_queue_wait", time.perf_counter() - started)
+
+    def acquire_blocking(self, tokens, priority):
+        """acquire() for threads other than the tracking loop's."""
+        asyncio.run_coroutine_threadsafe(self.acquire(tokens, priority), self.loop).result()
+
+    def settle(self, estimated_tokens, used_tokens):
+        """Returns the difference between a request's estimate and its reported usage to the token bucket."""
+        def adjust():
+            self._levels[1] = min(self._capacity[1], self._levels[1] + estimated_tokens - used_tokens)
+            self._release()
+        self.loop.call_soon_threadsafe(adjust)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        for i, capacity in enumerate(self._capacity):
+            self._levels[i] = min(capacity, self._levels[i] + elapsed * capacity / 60)
+
+    def _fits(self, tokens):
+        return self._levels[0] >= 1 and self._levels[1] >= tokens
+
+    def _take(self, tokens):
+        self._levels[0] -= 1
+        self._levels[1] -= tokens
+        self.granted += 1
+
+    def _expected_wait(self, tokens):
+        """Seconds until the queue ahead plus this request would fit, ignoring priority."""
+        queued = [queued_tokens for _, _, queued_tokens, future in self._waiters if not future.done()]
+        demands = (len(queued) + 1, sum(queued) + tokens)
+        return max((demand - level) * 60 / capacity
+                   for demand, level, capacity in zip(demands, self._levels, self._capacity))
+
+    def _release(self):
+        self._timer = None
+        self._refill()
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._fits(tokens):
+                break
+            heapq.heappop(self._waiters)
+            self._take(tokens)
+            self._set_depth(self.depth - 1)
+            future.set_result(None)
+        self._schedule()
+
+    def _schedule(self):
+        """Wakes up when the head of the queue will fit."""
+        if self._timer is not None or not self._waiters:
+            return
+        tokens = self._waiters[0][2]
+        delay = max(0.0, max((1 - self._levels[0]) * 60 / self._capacity[0],
+                             (tokens - self._levels[1]) * 60 / self._capacity[1]))
+        self._timer = self.loop.call_later(delay, self._release)
+
+    def _set_depth(self, depth):
+        self.depth = depth
+        self.max_depth = max(self.max_depth, depth)
+        if self._depth_gauge is not None:
+            self._depth_gauge.set(depth)
+
+    def _make_room(self, priority):
+        """Sheds the farthest queued request for a closer one, or else the caller."""
+        queued = [entry for entry in self._waiters if not entry[3].done()]
+        farthest = max(queued, default=None)
+        self._count_shed()
+        if farthest is None or farthest[0] <= priority:
+            raise OpenAIRequestShed("OpenAI rate limit budget exhausted")
+        farthest[3].set_exception(OpenAIRequestShed("Displaced by a closer page"))
+        self._set_depth(self.depth - 1)
+
+    def _count_shed(self):
+        self.shed += 1
+        if self._shed_counter is not None:
+            self._shed_counter.inc()
@@ -0,0 +1,41 @@
+"""
+Records passed between app.py's caches, tracking cycle and session state.
+"""
+
+
+class PageRecord:
+    """
+    One geosearch result. Records are shared by the tile cache, session
+    trackers and session state, so they use slots instead of a dict per page
+    and are never modified in place: re-ranking or revalidating makes a copy.
+    thumbnail and extract are None when the API didn't return them.
+    """
+    __slots__ = ("pageid", "title", "lat", "lon", "dist", "lastrevid", "thumbnail", "extract")
+
+    def __init__(self, pageid, title, lat, lon, dist, lastrevid=0, thumbnail=None, extract=None):
+        self.pageid = pageid
+        self.title = title
+        self.lat = lat
+        self.lon = lon
+        self.dist = dist
+        self.lastrevid = lastrevid
+        self.thumbnail = thumbnail
+        self.extract = extract
+
+    @classmethod
+    def from_geosearch(cls, page):
+        """From a dict shaped like a list=geosearch result, e.g. from the offline GeoIndex."""
+        return cls(page["pageid"], page["title"], page["lat"], page["lon"], page["dist"], page.get("lastrevid", 0))
+
+    def replace(self, **changes):
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return PageRecord(**fields)
+
+    def astuple(self):
+        """Field values in __slots__ order; PageRecord(*values) rebuilds the record."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def summary_key(self, model):
+        """Key of this page's summary in the summary store and the page cache."""
+        return self.pageid, self.lastrevid, model
@@ -0,0 +1,59 @@
+"""
+Request coalescing: concurrent identical lookups share one in-flight call.
+"""
+import asyncio
+import concurrent.futures
+import threading
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical lookups across sessions: the first caller for
+    a key runs the request, callers arriving while it is in flight wait for and
+    share its result (or exception).
+    """
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._tasks = {} # Only touched from the tracking loop's thread
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = concurrent.futures.Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.result()
+        try:
+            result = fn(*args)
+            call.set_result(result)
+            return result
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    async def do_async(self, key, fn, *args):
+        """
+        Coroutine variant for the tracking loop: fn is a coroutine function. The
+        shared task is shielded so one waiter being cancelled doesn't cancel it
+        for the others.
+        """
+        task = self._tasks.get(key)
+        with self._lock:
+            if task is None:
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn(*args))
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return await asyncio.shield(task)
@@ -0,0 +1,13 @@
+"""
+Most modules under test are plain Python. Tests of the tracking cycle import
+app.py, which runs the Streamlit page in bare mode and opens its summary store
+at SUMMARY_CACHE_PATH, so that points into a scratch directory.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "SUMMARY_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="st-geo-gpt-tests-"), "summaries.sqlite3")
+)
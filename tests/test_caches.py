@@ -0,0 +1,170 @@
+import time
+
+import pytest
+
+from caches import PageCache, RevisionCache, SQLiteSharedCache, SummaryStore, TileCache
+
+
+class DictSharedCache:
+    """Shared tier stand-in holding values in a dict."""
+    def __init__(self):
+        self.values = {}
+
+    def get_many(self, keys):
+        return {key: self.values[key] for key in keys if key in self.values}
+
+    def set_many(self, items, ttl_seconds):
+        self.values.update(items)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SummaryStore(str(tmp_path / "summaries.sqlite3"), 3)
+
+
+def test_summary_store_round_trip(store):
+    store.put(1, 10, "model", "One.")
+    assert store.get(1, 10, "model") == "One."
+    assert store.get(1, 11, "model") is None
+    assert store.get(1, 10, "other") is None
+    assert store.get_many([(1, 10), (2, 20)], "model") == {1: "One."}
+
+
+def test_summary_store_lookups_only_count_in_memory_until_flushed(store):
+    store.put(1, 10, "model", "One.")
+    store.get(1, 10, "model")
+    store.get(2, 20, "model")
+    counters = dict(store._conn.execute("SELECT name, value FROM counters").fetchall())
+    assert counters == {"hits": 0, "misses": 0}
+    assert store.stats() == {"hits": 1, "misses": 1, "entries": 1, "errors": 0}
+
+
+def test_summary_store_evicts_least_recently_used(store):
+    for page_id in (1, 2, 3):
+        store.put(page_id, 10, "model", f"Page {page_id}.")
+    store.get(1, 10, "model") # Page 2 is now the least recently used
+    store.put(4, 10, "model", "Page 4.")
+    assert store.get_many([(page_id, 10) for page_id in (1, 2, 3, 4)], "model").keys() == {1, 3, 4}
+    assert store.stats()["entries"] == 3
+
+
+def test_summary_store_drops_older_revisions_of_the_same_model(store):
+    store.put(1, 10, "model", "Old.")
+    store.put(1, 10, "other", "Other model.")
+    store.put(1, 11, "model", "New.")
+    assert store.get(1, 10, "model") is None
+    assert store.get(1, 11, "model") == "New."
+    assert store.get(1, 10, "other") == "Other model."
+
+
+def test_summary_store_errors_count_as_misses(store):
+    store.put(1, 10, "model", "One.")
+    store._conn.execute("DROP TABLE summaries")
+    assert store.get(1, 10, "model") is None
+    store.put(2, 20, "model", "Two.")
+    assert store.errors == 2
+
+
+def test_summary_store_fills_from_the_shared_tier(tmp_path):
+    shared = DictSharedCache()
+    writer = SummaryStore(str(tmp_path / "a.sqlite3"), 10, shared)
+    reader = SummaryStore(str(tmp_path / "b.sqlite3"), 10, shared)
+    writer.put(1, 10, "model", "One.")
+    assert reader.get(1, 10, "model") == "One."
+    shared.values.clear()
+    assert reader.get(1, 10, "model") == "One." # Now held locally
+
+
+def test_tile_cache_round_trip_and_expiry():
+    tiles = TileCache(60, 10)
+    tiles.put((1, 2, 250), (0.5, 0.5), 900, ["page"])
+    assert tiles.get((1, 2, 250)) == ((0.5, 0.5), 900, ["page"])
+    tiles.put((1, 3, 250), (0.5, 1.5), 900, [], fetched_at=time.time() - 61)
+    assert tiles.get((1, 3, 250)) is None
+    assert (tiles.hits, tiles.misses) == (1, 1)
+
+
+def test_tile_cache_evicts_least_recently_used():
+    tiles = TileCache(60, 2)
+    tiles.put("a", (0, 0), 1, [])
+    tiles.put("b", (0, 0), 1, [])
+    tiles.get("a")
+    tiles.put("c", (0, 0), 1, [])
+    assert tiles.get("b") is None
+    assert tiles.get("a") is not None and tiles.get("c") is not None
+
+
+def test_revision_cache_reports_only_recent_confirmations():
+    revisions = RevisionCache()
+    revisions.update({1: 10}, confirmed_at=time.time() - 100)
+    assert revisions.get(1, 200) == 10
+    assert revisions.get(1, 50) is None
+
+
+def test_revision_cache_keeps_the_more_recent_confirmation():
+    revisions = RevisionCache()
+    revisions.update({1: 11})
+    revisions.update({1: 10}, confirmed_at=time.time() - 100) # e.g. an older shared tile
+    assert revisions.get(1, 50) == 11
+
+
+def test_revision_cache_evicts_oldest_updated():
+    revisions = RevisionCache(max_pages=2)
+    revisions.update({1: 10, 2: 20})
+    revisions.update({3: 30})
+    assert revisions.get(1, 60) is None
+    assert (revisions.get(2, 60), revisions.get(3, 60)) == (20, 30)
+
+
+class Page:
+    def __init__(self, pageid, lastrevid):
+        self.pageid = pageid
+        self.lastrevid = lastrevid
+
+    def summary_key(self, model):
+        return (self.pageid, self.lastrevid, model)
+
+
+def test_page_cache_serves_summaries_per_model_at_the_current_revision():
+    pages = PageCache(10)
+    pages.update({(1, 10, "extract"): "Raw.", (1, 10, "condensed"): "Short.", (2, 20, "extract"): None})
+    assert pages.get((1, 10, "extract")) == "Raw."
+    assert pages.get((1, 10, "condensed")) == "Short."
+    assert pages.get((1, 11, "extract")) is None
+    assert pages.get((2, 20, "extract")) is None
+    assert pages.get_many([Page(1, 10), Page(2, 20)], "extract") == {1: "Raw."}
+    assert (pages.hits, pages.misses) == (1, 1)
+
+
+def test_page_cache_new_revision_drops_old_summaries():
+    pages = PageCache(10)
+    pages.update({(1, 10, "extract"): "Old.", (1, 10, "condensed"): "Old, short."})
+    pages.update({(1, 11, "extract"): "New."})
+    assert pages.get((1, 11, "extract")) == "New."
+    assert pages.get((1, 11, "condensed")) is None
+    assert pages.get((1, 10, "extract")) is None
+
+
+def test_page_cache_evicts_least_recently_used():
+    pages = PageCache(2)
+    pages.update({(1, 10, "m"): "One.", (2, 20, "m"): "Two."})
+    pages.get((1, 10, "m"))
+    pages.update({(3, 30, "m"): "Three."})
+    assert pages.get((2, 20, "m")) is None
+    assert pages.get((1, 10, "m")) == "One."
+
+
+def test_sqlite_shared_cache_round_trip_and_expiry(tmp_path):
+    shared = SQLiteSharedCache(str(tmp_path / "shared.sqlite3"))
+    shared.set_many({"a": "1", "b": "2"}, 60)
+    shared.set_many({"c": "3"}, -1) # Already expired
+    assert shared.get_many(["a", "b", "c", "d"]) == {"a": "1", "b": "2"}
+    assert (shared.hits, shared.misses, shared.errors) == (2, 2, 0)
+
+
+def test_sqlite_shared_cache_errors_count_as_misses(tmp_path):
+    shared = SQLiteSharedCache(str(tmp_path / "shared.sqlite3"))
+    shared._conn.execute("DROP TABLE shared_cache")
+    shared.set_many({"a": "1"}, 60)
+    assert shared.get_many(["a"]) == {}
+    assert (shared.misses, shared.errors) == (1, 2)
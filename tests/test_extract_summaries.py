@@ -0,0 +1,47 @@
+import app
+from app import EXTRACT_CACHE_MODEL, load_extract_summaries
+from caches import SummaryStore
+from rate_limit import OpenAIRequestShed
+from records import PageRecord
+
+
+def page(page_id, extract):
+    return PageRecord(page_id, f"Page {page_id}", 0.0, 0.0, 10.0, page_id * 10, None, extract)
+
+
+def condensing(monkeypatch, condense):
+    monkeypatch.setattr(app, "CONDENSE_EXTRACTS", True)
+    monkeypatch.setattr(app, "openai_enabled", True)
+    monkeypatch.setattr(app, "request_condensed_extract", condense)
+
+
+def test_raw_extracts_belong_to_the_extract_model(tmp_path):
+    store = SummaryStore(str(tmp_path / "summaries.sqlite3"), 100)
+    summaries = load_extract_summaries(store, [page(1, "An extract.")])
+    assert summaries[1] == (EXTRACT_CACHE_MODEL, "An extract.")
+    assert store.get(1, 10, EXTRACT_CACHE_MODEL) == "An extract."
+
+
+def test_condensed_extracts_belong_to_the_condensed_model(tmp_path, monkeypatch):
+    condensing(monkeypatch, lambda extract, priority: "Short.")
+    store = SummaryStore(str(tmp_path / "summaries.sqlite3"), 100)
+    summaries = load_extract_summaries(store, [page(1, "A long extract.")])
+    assert summaries[1] == (app.summary_model(), "Short.")
+    assert store.get(1, 10, app.summary_model()) == "Short."
+
+
+def test_failed_condensing_falls_back_under_the_extract_model(tmp_path, monkeypatch):
+    def shed(extract, priority):
+        raise OpenAIRequestShed()
+
+    condensing(monkeypatch, shed)
+    store = SummaryStore(str(tmp_path / "summaries.sqlite3"), 100)
+    summaries = load_extract_summaries(store, [page(1, "A long extract.")])
+    assert summaries[1] == (EXTRACT_CACHE_MODEL, "A long extract.")
+    assert store.get(1, 10, app.summary_model()) is None
+
+
+def test_label_follows_the_key_model():
+    assert app.summary_label((1, 10, EXTRACT_CACHE_MODEL)) == "Wikipedia"
+    assert app.summary_label((1, 10, f"{app.SUMMARY_CACHE_KEY}:{EXTRACT_CACHE_MODEL}")) == "AI Summary"
+    assert app.summary_label((1, 10, app.SUMMARY_CACHE_KEY)) == "AI Summary"
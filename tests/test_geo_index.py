@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from geo_index import GeoIndex, haversine_meters, write_index
+
+
+def build(tmp_path, lats, lons, titles=None):
+    ids = list(range(1, len(lats) + 1))
+    path = tmp_path / "geo_index.bin"
+    write_index(path, ids, [i * 10 for i in ids], lats, lons, titles or [f"Page {i}" for i in ids])
+    return GeoIndex(path)
+
+
+@pytest.fixture
+def scattered(tmp_path):
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(40.70, 40.80, 5000).astype(np.float32)
+    lons = rng.uniform(-74.05, -73.95, 5000).astype(np.float32)
+    return build(tmp_path, lats, lons), lats, lons
+
+
+@pytest.mark.parametrize("radius", [100, 250, 1500])
+def test_query_matches_brute_force(scattered, radius):
+    index, lats, lons = scattered
+    center = (40.7484, -73.9857)
+    expected = sorted(
+        (haversine_meters(*center, float(lat), float(lon)), i + 1) for i, (lat, lon) in enumerate(zip(lats, lons))
+    )
+    expected = [page_id for dist, page_id in expected if dist <= radius]
+    results = index.query(*center, radius, limit=len(expected) + 10)
+    assert [page["pageid"] for page in results] == expected
+    assert all(page["dist"] <= radius for page in results)
+
+
+def test_query_returns_nearest_first_up_to_limit(scattered):
+    index, _, _ = scattered
+    results = index.query(40.7484, -73.9857, 1500, limit=10)
+    assert len(results) == 10
+    assert [page["dist"] for page in results] == sorted(page["dist"] for page in results)
+    page = results[0]
+    assert page["title"] == f"Page {page['pageid']}"
+    assert page["lastrevid"] == page["pageid"] * 10
+
+
+def test_query_far_from_any_point_is_empty(scattered):
+    index, _, _ = scattered
+    assert index.query(-33.86, 151.21, 10000) == []
+
+
+def test_query_wraps_around_the_antimeridian(tmp_path):
+    index = build(tmp_path, [0.0, 0.0, 0.0], [179.9995, -179.9995, 90.0])
+    results = index.query(0.0, 180.0, 200)
+    assert sorted(page["pageid"] for page in results) == [1, 2]
+
+
+def test_titles_round_trip_utf8(tmp_path):
+    index = build(tmp_path, [48.8584], [2.2945], ["Tour Eiffel — Champ-de-Mars"])
+    assert index.query(48.8584, 2.2945, 10)[0]["title"] == "Tour Eiffel — Champ-de-Mars"
@@ -0,0 +1,22 @@
+import metrics
+
+
+def test_churn_stats_counts_changes_across_searches():
+    churn = metrics.ChurnStats()
+    assert churn.churn() == 0.0
+    churn.observe(0, 4, 0)
+    churn.observe(3, 1, 1)
+    assert (churn.searches, churn.kept, churn.added, churn.removed) == (2, 3, 5, 1)
+    assert churn.churn() == 6 / 9
+
+
+def test_stage_timings_keep_a_rolling_window():
+    timings = metrics.StageTimings(3)
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        timings.observe("geosearch", seconds)
+    with timings.span("render"):
+        pass
+    rows = {row["stage"]: row for row in timings.summary()}
+    assert rows["geosearch"]["count"] == 3
+    assert (rows["geosearch"]["p50 (ms)"], rows["geosearch"]["last (ms)"]) == (300.0, 400.0)
+    assert rows["render"]["count"] == 1
@@ -0,0 +1,35 @@
+import time
+
+import app
+from app import REQUERY_DISTANCE_FRACTION, SEARCH_RADIUS_METERS, needs_requery
+from geo_index import METERS_PER_DEGREE_LAT
+
+THRESHOLD = REQUERY_DISTANCE_FRACTION * SEARCH_RADIUS_METERS
+
+
+def query(age_seconds=0):
+    return {"latitude": 40.0, "longitude": -74.0, "time": time.time() - age_seconds}
+
+
+def fix(meters_north, accuracy=None):
+    return {"latitude": 40.0 + meters_north / METERS_PER_DEGREE_LAT, "longitude": -74.0, "accuracy": accuracy}
+
+
+def test_first_check_always_searches():
+    assert needs_requery(None, fix(0))
+
+
+def test_small_moves_reuse_the_last_search():
+    assert not needs_requery(query(), fix(0))
+    assert not needs_requery(query(), fix(THRESHOLD - 1))
+    assert needs_requery(query(), fix(THRESHOLD + 1))
+
+
+def test_moves_within_the_fix_accuracy_are_jitter():
+    assert not needs_requery(query(), fix(THRESHOLD + 20, accuracy=30))
+    assert needs_requery(query(), fix(THRESHOLD + 40, accuracy=30))
+
+
+def test_old_results_are_searched_again():
+    assert not needs_requery(query(app.MAX_RESULTS_AGE_SECONDS - 5), fix(0))
+    assert needs_requery(query(app.MAX_RESULTS_AGE_SECONDS + 5), fix(0))
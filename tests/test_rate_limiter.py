@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import pytest
+
+from rate_limit import OpenAIRateLimiter, OpenAIRequestShed
+
+
+def run(test):
+    """Runs test(limiter_factory) on a fresh event loop."""
+    async def main():
+        loop = asyncio.get_running_loop()
+        return await test(lambda *args: OpenAIRateLimiter(loop, *args))
+    return asyncio.run(main())
+
+
+def drain(limiter, requests=0, tokens=0):
+    """Empties the buckets, leaving this much budget."""
+    limiter._levels = [requests, tokens]
+    limiter._refilled_at = time.monotonic()
+
+
+def test_grants_immediately_within_budget():
+    async def test(make):
+        limiter = make(60, 10000, 5, 5)
+        await limiter.acquire(100, 0)
+        await limiter.acquire(100, 0)
+        return limiter
+    limiter = run(test)
+    assert (limiter.granted, limiter.shed, limiter.depth) == (2, 0, 0)
+
+
+def test_serves_waiters_closest_first():
+    async def test(make):
+        limiter = make(600, 100000, 10, 5) # One request per 0.1s
+        drain(limiter)
+        order = []
+
+        async def request(priority):
+            await limiter.acquire(10, priority)
+            order.append(priority)
+
+        await asyncio.gather(*(request(priority) for priority in (9, 5, 7, 1, 3)))
+        return limiter, order
+    limiter, order = run(test)
+    assert order == [1, 3, 5, 7, 9]
+    assert limiter.max_depth == 5
+    assert limiter.depth == 0
+
+
+def test_full_queue_sheds_farthest_for_closer_request():
+    async def test(make):
+        limiter = make(600, 100000, 2, 5)
+        drain(limiter)
+        far = asyncio.ensure_future(limiter.acquire(10, 100))
+        mid = asyncio.ensure_future(limiter.acquire(10, 50))
+        await asyncio.sleep(0)
+        near = asyncio.ensure_future(limiter.acquire(10, 1))
+        await asyncio.gather(mid, near)
+        with pytest.raises(OpenAIRequestShed):
+            await far
+        return limiter
+    limiter = run(test)
+    assert limiter.shed == 1
+    assert limiter.depth == 0
+
+
+def test_full_queue_sheds_caller_when_it_is_farthest():
+    async def test(make):
+        limiter = make(600, 100000, 1, 5)
+        drain(limiter)
+        near = asyncio.ensure_future(limiter.acquire(10, 1))
+        await asyncio.sleep(0)
+        with pytest.raises(OpenAIRequestShed):
+            await limiter.acquire(10, 100)
+        await near
+        return limiter
+    limiter = run(test)
+    assert (limiter.granted, limiter.shed) == (1, 1)
+
+
+def test_sheds_request_that_would_wait_too_long():
+    async def test(make):
+        limiter = make(6, 100000, 10, 1) # One request per 10s, waits capped at 1s
+        drain(limiter)
+        with pytest.raises(OpenAIRequestShed):
+            await limiter.acquire(10, 0)
+        return limiter
+    limiter = run(test)
+    assert limiter.shed == 1
+    assert limiter.depth == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def test(make):
+        limiter = make(6, 100000, 10, 30)
+        drain(limiter)
+        waiter = asyncio.ensure_future(limiter.acquire(10, 0))
+        await asyncio.sleep(0.01)
+        assert limiter.depth == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return limiter
+    limiter = run(test)
+    assert limiter.depth == 0
+    assert limiter.granted == 0
+
+
+def test_token_budget_refills_over_time():
+    async def test(make):
+        limiter = make(6000, 600, 10, 5) # 10 tokens per second
+        drain(limiter, requests=100)
+        started = time.monotonic()
+        await limiter.acquire(2, 0)
+        return time.monotonic() - started
+    waited = run(test)
+    assert 0.15 <= waited < 1
+
+
+def test_settle_returns_unused_tokens():
+    async def test(make):
+        limiter = make(60, 1000, 5, 5)
+        await limiter.acquire(400, 0)
+        limiter.settle(400, 100)
+        await asyncio.sleep(0)
+        return limiter
+    limiter = run(test)
+    assert limiter._levels[1] == pytest.approx(900, abs=1)
+
+
+def test_reports_queue_waits_to_timings():
+    samples = []
+
+    class Timings:
+        def observe(self, stage, seconds):
+            samples.append((stage, seconds))
+
+    async def test(make):
+        limiter = OpenAIRateLimiter(asyncio.get_running_loop(), 600, 100000, 10, 5, Timings())
+        drain(limiter)
+        await limiter.acquire(10, 0)
+    run(test)
+    [(stage, seconds)] = samples
+    assert stage == "openai_queue_wait" and seconds > 0.05
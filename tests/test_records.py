@@ -0,0 +1,26 @@
+import pytest
+
+from records import PageRecord
+
+
+def test_from_geosearch_result():
+    page = PageRecord.from_geosearch({"pageid": 1, "title": "A", "lat": 40.0, "lon": -74.0, "dist": 12.5})
+    assert page.astuple() == (1, "A", 40.0, -74.0, 12.5, 0, None, None)
+
+
+def test_replace_copies_and_leaves_the_original():
+    page = PageRecord(1, "A", 40.0, -74.0, 12.5, 10, "thumb.jpg", "Extract.")
+    moved = page.replace(dist=30.0, extract=None)
+    assert moved.astuple() == (1, "A", 40.0, -74.0, 30.0, 10, "thumb.jpg", None)
+    assert page.dist == 12.5 and page.extract == "Extract."
+
+
+def test_astuple_round_trips():
+    page = PageRecord(1, "A", 40.0, -74.0, 12.5, 10, "thumb.jpg")
+    assert PageRecord(*page.astuple()).astuple() == page.astuple()
+    assert page.summary_key("model") == (1, 10, "model")
+
+
+def test_records_have_no_instance_dict():
+    with pytest.raises(AttributeError):
+        PageRecord(1, "A", 40.0, -74.0, 12.5).extra = 1
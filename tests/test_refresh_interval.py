@@ -0,0 +1,84 @@
+import pytest
+
+import app
+from app import MAX_REFRESH_SECONDS, MIN_REFRESH_SECONDS, adapt_refresh_interval, estimate_speed, record_sample
+from geo_index import METERS_PER_DEGREE_LAT
+from records import PageRecord
+
+
+def test_unknown_speed_keeps_the_interval():
+    assert adapt_refresh_interval(60, None, 0.0, failed=False) == 60
+
+
+def test_standing_still_backs_off_to_the_cap():
+    interval = MIN_REFRESH_SECONDS
+    for _ in range(10):
+        interval = adapt_refresh_interval(interval, 0.1, 0.0, failed=False)
+    assert interval == MAX_REFRESH_SECONDS
+
+
+def test_speed_targets_the_requery_distance():
+    # Walking: 50m at 1.4 m/s is ~36s, rounded to 15 * 2
+    assert adapt_refresh_interval(120, 1.4, 0.0, failed=False) == 30
+    # Driving: far below the floor
+    assert adapt_refresh_interval(120, 15, 0.0, failed=False) == MIN_REFRESH_SECONDS
+
+
+def test_churn_at_most_halves_the_interval():
+    assert adapt_refresh_interval(120, None, app.CHURN_SPEEDUP_FRACTION, failed=False) == 60
+    assert adapt_refresh_interval(120, None, app.CHURN_SPEEDUP_FRACTION / 2, failed=False) == 120
+
+
+def test_failures_back_off_exponentially():
+    interval = MIN_REFRESH_SECONDS
+    seen = []
+    for _ in range(6):
+        interval = adapt_refresh_interval(interval, 15, 1.0, failed=True)
+        seen.append(interval)
+    assert seen == [30, 60, 120, 240, MAX_REFRESH_SECONDS, MAX_REFRESH_SECONDS]
+
+
+@pytest.mark.parametrize("speed", [None, 0.0, 0.7, 3, 30])
+@pytest.mark.parametrize("churn", [0.0, 1.0])
+def test_result_is_a_power_of_two_step_within_bounds(speed, churn):
+    interval = adapt_refresh_interval(45, speed, churn, failed=False)
+    assert interval == MAX_REFRESH_SECONDS or interval in [MIN_REFRESH_SECONDS * 2 ** n for n in range(5)]
+
+
+def test_first_search_is_not_churn():
+    pages = [PageRecord(1, "A", 0.0, 0.0, 10.0, 1, None, None)]
+    assert app.result_churn([], pages) == 0.0
+    assert app.result_churn(pages, []) == 1.0
+
+
+def test_history_keeps_the_previous_sample_past_the_window():
+    history = []
+    for t in (0, 30, 60, 300, 600):
+        record_sample(history, t, 40.0, -74.0)
+    assert [sample[0] for sample in history] == [300, 600]
+    record_sample(history, 610, 40.0, -74.0)
+    record_sample(history, 620, 40.0, -74.0)
+    assert [sample[0] for sample in history] == [600, 610, 620]
+
+
+def test_stationary_then_walking_speeds_back_up():
+    history, interval, now = [], app.REFRESH_INTERVAL_SECONDS, 0.0
+    intervals = []
+
+    def check(lat):
+        nonlocal interval, now
+        record_sample(history, now, lat, -74.0)
+        interval = adapt_refresh_interval(interval, estimate_speed(history), 0.0, failed=False)
+        intervals.append(interval)
+        now += interval
+
+    for _ in range(6):
+        check(40.0)
+    assert intervals[-1] == MAX_REFRESH_SECONDS
+    assert app.predict_position(history, interval) is not None
+
+    walk_started = now - interval # Set off right after the last check
+    for _ in range(3):
+        check(40.0 + 1.4 * (now - walk_started) / METERS_PER_DEGREE_LAT)
+    # The first check after setting off at 1.4 m/s sees the whole walk since the last fix
+    assert intervals[-3:] == [30, 30, 30]
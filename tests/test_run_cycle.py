@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+import app
+from app import TrackingEngine
+from caches import PageCache
+from records import PageRecord
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = TrackingEngine(2, None)
+    yield engine
+    engine.loop.call_soon_threadsafe(engine.loop.stop)
+
+
+@pytest.fixture
+def cycle(engine, monkeypatch):
+    """Runs a cycle over the given pages and returns its result and the page ids it summarized."""
+    cache = PageCache(100)
+    monkeypatch.setattr(app, "get_page_cache", lambda: cache)
+    monkeypatch.setattr(app, "summary_model", lambda: "model")
+
+    def run(pages, known=None, produced_by="model"):
+        summarized = []
+
+        async def summarize(pages, priority_offset, land):
+            for page in pages:
+                summarized.append(page.pageid)
+                land(page, f"Summary of {page.title}", produced_by)
+
+        monkeypatch.setattr(app, "find_nearby_pages", lambda *args: pages)
+        monkeypatch.setattr(engine, "summarize", summarize)
+        result = asyncio.run_coroutine_threadsafe(engine.run_cycle(40.0, -74.0, known=known), engine.loop).result(5)
+        return result, summarized
+
+    run.cache = cache
+    return run
+
+
+def page(page_id, revision):
+    return PageRecord(page_id, f"Page {page_id}", 40.0, -74.0, 10.0 * page_id, revision)
+
+
+def test_first_cycle_summarizes_every_page(cycle):
+    result, summarized = cycle([page(1, 10), page(2, 20)])
+    assert summarized == [1, 2]
+    assert result["summaries"] == {1: (1, 10, "model"), 2: (2, 20, "model")}
+    assert cycle.cache.get((1, 10, "model")) == "Summary of Page 1"
+
+
+def test_pages_still_in_range_carry_their_summaries_over(cycle):
+    first, _ = cycle([page(1, 10), page(2, 20)])
+    cycle.cache.update({(3, 30, "model"): "Held for another session"})
+    result, summarized = cycle([page(2, 20), page(3, 30), page(4, 40)], known=first["summaries"])
+    assert summarized == [4] # 2 carried over, 3 from the page cache
+    assert result["summaries"] == {2: (2, 20, "model"), 3: (3, 30, "model"), 4: (4, 40, "model")}
+
+
+def test_edited_pages_are_summarized_again(cycle):
+    first, _ = cycle([page(1, 10)])
+    result, summarized = cycle([page(1, 11)], known=first["summaries"])
+    assert summarized == [1]
+    assert result["summaries"] == {1: (1, 11, "model")}
+
+
+def test_fallback_summaries_are_not_carried_over(cycle):
+    # Condensing failed, so the raw extract landed under its own model; the next cycle retries
+    first, _ = cycle([page(1, 10)], produced_by="extract")
+    assert first["summaries"] == {1: (1, 10, "extract")}
+    _, summarized = cycle([page(1, 10)], known=first["summaries"])
+    assert summarized == [1]
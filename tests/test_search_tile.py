@@ -0,0 +1,55 @@
+import pytest
+
+import app
+from app import search_tile, tile_for
+from caches import TileCache
+from geo_index import METERS_PER_DEGREE_LAT, haversine_meters
+from records import PageRecord
+
+LAT, LON = 40.7484, -73.9857
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Serves tile fetches from synthetic pages every 100m north of the tile center, recording each request."""
+    calls = []
+
+    def query_geosearch(latitude, longitude, radius_meters, limit):
+        calls.append((latitude, longitude, radius_meters, limit))
+        pages = [
+            PageRecord(n, f"Page {n}", latitude + n * 100 / METERS_PER_DEGREE_LAT, longitude, n * 100.0, n)
+            for n in range(1, 11)
+        ]
+        return pages[:limit]
+
+    monkeypatch.setattr(app, "query_geosearch", query_geosearch)
+    monkeypatch.setattr(app, "get_shared_cache", lambda: None)
+    tiles = TileCache(app.TILE_TTL_SECONDS, 10)
+    monkeypatch.setattr(app, "get_tile_cache", lambda: tiles)
+    return calls
+
+
+def test_fetches_the_covering_tile_once(fetches):
+    first = search_tile(LAT, LON, 250)
+    second = search_tile(LAT + 0.0005, LON, 250)
+    assert len(fetches) == 1
+    center_lat, center_lon, fetch_radius, limit = fetches[0]
+    assert tile_for(center_lat, center_lon) == tile_for(LAT, LON)
+    assert fetch_radius >= 250 + haversine_meters(LAT, LON, center_lat, center_lon)
+    assert limit == app.TILE_FETCH_LIMIT
+    for pages, lat in ((first, LAT), (second, LAT + 0.0005)):
+        dists = [page.dist for page in pages]
+        assert dists == sorted(dists)
+        assert all(dist <= 250 for dist in dists)
+        assert all(dist == pytest.approx(haversine_meters(lat, LON, page.lat, page.lon))
+                   for page, dist in zip(pages, dists))
+
+
+def test_truncated_tile_only_covers_up_to_its_farthest_page(fetches, monkeypatch):
+    monkeypatch.setattr(app, "TILE_FETCH_LIMIT", 3)
+    search_tile(LAT, LON, 250)
+    center_lat, center_lon = fetches[0][:2]
+    # A full page of results: the tile only covers out to its 3rd page, 300m from the center
+    assert search_tile(center_lat, center_lon, 250) is not None
+    assert search_tile(center_lat - 100 / METERS_PER_DEGREE_LAT, center_lon, 250) is None
+    assert len(fetches) == 1
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+import app
+from app import SessionTracker, TrackingEngine
+from records import PageRecord
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = TrackingEngine(2, None)
+    yield engine
+    engine.loop.call_soon_threadsafe(engine.loop.stop)
+
+
+def fix():
+    return {"latitude": 40.0, "longitude": -74.0, "accuracy": 5, "timestamp": time.time() * 1000}
+
+
+def wait_idle(tracker):
+    deadline = time.monotonic() + 5
+    while tracker.busy:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_publish_merges_until_drained(engine):
+    tracker = SessionTracker(engine)
+    assert not tracker.pending
+    tracker.publish({"status_message": "Searching...", "last_results": []})
+    tracker.publish({"status_message": "Found 1 page(s)."})
+    assert tracker.pending
+    assert tracker.drain() == {"status_message": "Found 1 page(s).", "last_results": []}
+    assert tracker.drain() == {}
+
+
+def test_reports_start_a_check_only_when_due(engine, monkeypatch):
+    checks = []
+
+    async def check(location):
+        checks.append(location)
+
+    monkeypatch.setattr(SessionTracker, "_check", lambda self, location: check(location))
+    tracker = SessionTracker(engine)
+    assert tracker.report_location(fix())
+    wait_idle(tracker)
+    assert not tracker.report_location(fix()) # Next one is a refresh interval away
+    assert len(checks) == 1
+    assert tracker.next_check_at > time.time()
+
+
+def test_summaries_landing_after_the_check_are_not_republished(engine, monkeypatch):
+    page = PageRecord(1, "Page 1", 40.0, -74.0, 10.0, 10)
+    late = []
+
+    async def run_cycle(latitude, longitude, known=None, on_progress=None, **kwargs):
+        result = {"query": {"latitude": latitude, "longitude": longitude, "time": time.time()},
+                  "pages": [page], "summaries": {}, "error": None}
+        on_progress(result)
+        late.append(lambda: on_progress(result)) # A summary past SUMMARY_DEADLINE_SECONDS
+        return result
+
+    monkeypatch.setattr(engine, "run_cycle", run_cycle)
+    monkeypatch.setattr(app, "PREFETCH_ENABLED", False)
+    tracker = SessionTracker(engine)
+    tracker.report_location(fix())
+    wait_idle(tracker)
+    assert tracker.drain()["status_message"].startswith("✅ Found 1 page(s). Waiting")
+    late[0]()
+    assert not tracker.pending
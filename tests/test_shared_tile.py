@@ -0,0 +1,58 @@
+import json
+import time
+
+import pytest
+
+import app
+from app import load_shared_tile, store_shared_tile
+from caches import RevisionCache, SQLiteSharedCache, shared_key
+from records import PageRecord
+
+KEY = (100, -200, 250)
+
+
+@pytest.fixture
+def revisions(monkeypatch):
+    revisions = RevisionCache()
+    monkeypatch.setattr(app, "get_revision_cache", lambda: revisions)
+    return revisions
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch, revisions):
+    shared = SQLiteSharedCache(str(tmp_path / "shared.sqlite3"))
+    monkeypatch.setattr(app, "get_shared_cache", lambda: shared)
+    return shared
+
+
+def test_stored_tile_round_trips_with_its_revisions(shared, revisions):
+    pages = [PageRecord(1, "Page 1", 40.0, -74.0, 10.0, 11, "thumb.jpg"), PageRecord(2, "Page 2", 40.0, -74.0, 20.0)]
+    store_shared_tile(KEY, (40.0, -74.0), 900, pages)
+    center, covered_radius, loaded, fetched_at = load_shared_tile(KEY)
+    assert (center, covered_radius) == ((40.0, -74.0), 900)
+    assert [page.astuple() for page in loaded] == [page.astuple() for page in pages]
+    assert fetched_at == pytest.approx(time.time(), abs=5)
+    # Revisions count as confirmed when the tile was fetched; pages without one aren't recorded
+    assert revisions.get(1, 60) == 11
+    assert revisions.get(2, float("inf")) is None
+
+
+def test_missing_tile_is_a_miss(shared):
+    assert load_shared_tile(KEY) is None
+    assert shared.misses == 1
+
+
+def test_no_shared_tier_is_a_miss(monkeypatch):
+    monkeypatch.setattr(app, "get_shared_cache", lambda: None)
+    assert load_shared_tile(KEY) is None
+
+
+@pytest.mark.parametrize("value", [
+    "not json",
+    json.dumps({"fetched_at": 0}),
+    json.dumps([time.time(), [40.0, -74.0], 900, [[1, "Page 1"]]]), # Written with another PageRecord layout
+])
+def test_corrupt_tile_counts_as_an_error(shared, value):
+    shared.set_many({shared_key("tile", *KEY): value}, 60)
+    assert load_shared_tile(KEY) is None
+    assert shared.errors == 1
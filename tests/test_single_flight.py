@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_do_coalesces_concurrent_callers():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def lookup(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", lookup, 21))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [21]
+    assert results == [42] * 5
+    assert (flight.leaders, flight.coalesced) == (1, 4)
+
+
+def test_do_shares_exceptions_and_forgets_the_key():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("upstream")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "ok") == "ok"
+    assert flight.leaders == 2
+
+
+def test_do_async_coalesces_concurrent_callers():
+    flight = SingleFlight()
+    calls = []
+
+    async def lookup(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", lookup, 21) for _ in range(5)))
+
+    assert asyncio.run(main()) == [42] * 5
+    assert calls == [21]
+    assert (flight.leaders, flight.coalesced) == (1, 4)
+
+
+def test_do_async_cancelled_waiter_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def lookup():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do_async("key", lookup))
+        second = asyncio.ensure_future(flight.do_async("key", lookup))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "ok"
+
+
+def test_do_async_runs_again_once_the_call_finished():
+    flight = SingleFlight()
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        return [await flight.do_async("key", lookup), await flight.do_async("key", lookup)]
+
+    assert asyncio.run(main()) == [1, 2]
+    assert flight.coalesced == 0
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+import requests
+
+import app
+from app import validate_revisions
+from caches import RevisionCache
+from records import PageRecord
+
+
+@pytest.fixture
+def revisions(monkeypatch):
+    cache = RevisionCache()
+    monkeypatch.setattr(app, "get_revision_cache", lambda: cache)
+    return cache
+
+
+def pages(*revisions):
+    return [PageRecord(n, f"Page {n}", 0.0, 0.0, 10.0 * n, revision) for n, revision in enumerate(revisions, 1)]
+
+
+def test_recently_confirmed_pages_skip_the_request(revisions, monkeypatch):
+    monkeypatch.setattr(app, "query_revisions", lambda page_ids: pytest.fail("unexpected request"))
+    revisions.update({1: 10, 2: 20})
+    current = pages(10, 20)
+    assert validate_revisions(current) == current
+
+
+def test_stale_pages_are_refreshed_in_one_request(revisions, monkeypatch):
+    requested = []
+
+    def query_revisions(page_ids):
+        requested.append(page_ids)
+        return {2: 21, 3: 30}
+
+    monkeypatch.setattr(app, "query_revisions", query_revisions)
+    revisions.update({1: 10})
+    revisions.update({2: 20}, confirmed_at=time.time() - app.REVISION_CHECK_SECONDS - 1)
+    validated = validate_revisions(pages(10, 20, 30))
+    assert requested == [[2, 3]]
+    assert [page.lastrevid for page in validated] == [10, 21, 30]
+
+
+def test_failed_check_keeps_the_known_revisions(revisions, monkeypatch):
+    def query_revisions(page_ids):
+        raise requests.exceptions.ConnectionError("offline")
+
+    monkeypatch.setattr(app, "query_revisions", query_revisions)
+    revisions.update({1: 11}, confirmed_at=time.time() - app.REVISION_CHECK_SECONDS - 1)
+    assert [page.lastrevid for page in validate_revisions(pages(10, 20))] == [11, 20]